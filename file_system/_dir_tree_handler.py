@@ -4,14 +4,18 @@
 from typing import Union
 from enum import Enum
 import os
+import sys
+import time
 import json
 import copy
+from collections import OrderedDict
 from datetime import datetime
 
 # 第三方库模块 (无)
 
 # 自定义模块
 from .errors import (
+    FileSystemError,
     PathNotExists,
     PathIsNotDir,
     InvalidCurrentDirOperation,
@@ -22,6 +26,12 @@ from .errors import (
     InvalidOperation
 )
 
+# 用于设置的全局变量.
+RESOLVE_CACHE_SIZE = 1024  # 路径解析缓存的容量.
+NEGATIVE_CACHE_SIZE = 256  # 不存在的路径的缓存的容量.
+LOG_FILE_SUFFIX = ".log"  # 修改日志文件的名字是在 `json` 文件的名字后加上这个后缀.
+LOG_COMPACT_RATIO = 0.5  # 修改日志的大小超过 `json` 文件的大小的这个倍数时, 保存时改为重写整个 `json` 文件 (并清空日志) .
+
 
 # 枚举类
 class NoteIndex(Enum):
@@ -43,6 +53,181 @@ class MetadataIndex(Enum):
     LAST_MODIFY_TIME = '1'  # 最后修改时间
 
 
+# 热路径上使用的结点结构的索引和元数据索引 (避免每次访问都查找枚举的属性) .
+_IS_DIR = NoteIndex.IS_DIR.value
+_METADATA = NoteIndex.METADATA.value
+_CONTENT = NoteIndex.CONTENT.value
+_CREATE_TIME = MetadataIndex.CREATE_TIME.value
+_LAST_MODIFY_TIME = MetadataIndex.LAST_MODIFY_TIME.value
+
+
+# 元数据中可以直接共享 (不需要复制) 的值的类型.
+_IMMUTABLE_VALUE_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def _copy_metadata(metadata: dict) -> dict:
+    """复制一个元数据字典.
+
+    Notes:
+        * 元数据的值一般都是字符串, 此时浅拷贝就足够了, 这比 `copy.deepcopy` 快得多.
+        * 只有当其中有可变的值 (比如列表、字典) 时, 才退回到深拷贝.
+    """
+    for value in metadata.values():
+        if type(value) not in _IMMUTABLE_VALUE_TYPES:
+            return copy.deepcopy(metadata)
+    return dict(metadata)
+
+
+# 编码成 json 后只含 ASCII 字符的非字符串值的类型.
+_ASCII_SCALAR_TYPES = frozenset((int, float, bool, type(None)))
+
+
+def _is_ascii_metadata(metadata: dict) -> bool:
+    """判断一个元数据字典编码成 json 后是否一定只含 ASCII 字符.
+
+    Notes:
+        * 只认可键和值都是 ASCII 字符串 (或者值是数字、布尔值、None) 的情况, 其他情况 (比如嵌套的列表或字典) 都保守地返回False.
+    """
+    for key, value in metadata.items():
+        if not (isinstance(key, str) and key.isascii()):
+            return False
+        if isinstance(value, str):
+            if not value.isascii():
+                return False
+        elif type(value) not in _ASCII_SCALAR_TYPES:
+            return False
+    return True
+
+
+# 结点类
+class Note:
+    """目录树的结点.
+
+    Notes:
+        * 使用 `__slots__`, 访问结点的各个部分只需一次属性访问, 而不是列表索引加枚举的属性查找.
+        * 在内存中使用该类表示结点, 在 `json` 文件中仍然使用列表 `[是否是目录, 元数据字典, 内容]` 表示结点
+          (列表的索引见 `NoteIndex`) , 两者通过 `from_json` 和 `to_json` 转换, 所以 `json` 文件的格式不变.
+        * 内容: 如果是目录, 则是一个子结点字典; 如果是文件, 则是它的散列值 (没有散列值时是空字符串, 它是共享的, 不用为每个文件
+          分配一个对象; 以前的 `json` 文件中没有散列值的文件的内容是一个空字典, 两者都被视为没有散列值) .
+          散列值和结点的名称一样会被驻留, 所以相同的文件 (去重之后) 的结点共享同一个字符串.
+        * `pending_time` 是挂起的最后修改时间: 它对该结点的所有子结点 (不包括它自己) 生效, 一个结点实际的最后修改时间是
+          它自己的元数据中的最后修改时间和所有上层结点的 `pending_time` 中最晚的那个. 这样移动一个目录时只需在它上面记一次,
+          而不用遍历它的所有子结点; 保存时 (`to_json`) 再把它落实到各个结点的元数据中.
+        * 由 `from_json` 生成的目录结点是延迟加载的: 它的子结点在第一次访问 `content` 时才生成 (见 `__getattr__`) ,
+          在此之前 `content` 这个槽是空的, `_raw` 是 `json` 文件中的子结点字典. 这样加载时只需 `json.loads` 一次,
+          没有访问过的子树不需要生成结点, 保存时也直接输出原来的结构.
+    """
+    __slots__ = ('is_dir', 'metadata', 'content', 'pending_time', '_raw')
+
+    def __init__(self, is_dir: bool, metadata: dict = None, content: Union[dict, str] = None):
+        self.is_dir = is_dir
+        self.metadata = {} if metadata is None else metadata
+        if content is None:
+            content = {} if is_dir else ''
+        self.content = content
+        self.pending_time = None
+        self._raw = None
+
+    def __getattr__(self, name: str):
+        """只在访问空的槽时被调用: 第一次访问延迟加载的目录结点的 `content` 时生成它的子结点 (子结点的名称会被驻留) .
+
+        Notes:
+            * 生成之后 `content` 就是一个普通的槽, 之后的访问不再经过这里, 所以没有额外的开销.
+        """
+        if name != 'content' or self._raw is None:
+            raise AttributeError(name)
+        content = {sys.intern(child_name): Note.from_json(child) for child_name, child in self._raw.items()}
+        self.content = content
+        self._raw = None
+        return content
+
+    @classmethod
+    def from_json(cls, data: list) -> "Note":
+        """由 `json` 文件中的列表结构生成结点 (目录结点是延迟加载的, 见类的文档字符串) ."""
+        if not data[_IS_DIR]:
+            content = data[_CONTENT]
+            if type(content) is str:
+                content = sys.intern(content)
+            return cls(False, data[_METADATA], content)
+        note = cls.__new__(cls)
+        note.is_dir = True
+        note.metadata = data[_METADATA]
+        note.pending_time = None
+        note._raw = data[_CONTENT]
+        return note
+
+    def clone(self, last_modify_time: str = None, file_hashes: list = None) -> "Note":
+        """生成该结点 (包括所有子结点) 的独立副本.
+
+        Notes:
+            * 只处理结点本身的结构, 不经过 `copy.deepcopy` 的备忘字典和 `__reduce_ex__` 等通用机制.
+            * 文件的内容是散列值字符串 (或表示没有散列值的空字符串) , 字符串是不可变的, 直接共享 (以前的 `json` 文件中的空字典
+              被换成空字符串) .
+            * 该结点的上层结点的 `pending_time` 不会被带到副本中, 所以复制一个有挂起时间的子树时应当指定 `last_modify_time`.
+
+        Args:
+            last_modify_time: 如果不为 None, 在复制的同时把副本中所有结点的最后修改时间设为该值
+                              (这样就不需要在复制之后再遍历一次副本) .
+            file_hashes: 如果不为 None, 在复制的同时把副本中所有文件的散列值 (没有散列值的是空字符串) 追加到其中
+                         (这样就不需要为了处理引用计数再遍历一次副本) .
+        """
+        root = self.__clone_note(last_modify_time, file_hashes)
+        # 用一个栈迭代地复制子树, 而不是递归 (很深的目录也不会超过递归的深度限制) .
+        pending = [(self, root)] if self.is_dir else []  # 待复制子结点的 (目录结点, 它的副本) .
+        while pending:
+            note, note_copy = pending.pop()
+            content = note_copy.content
+            for name, child in note.content.items():
+                child_copy = content[name] = child.__clone_note(last_modify_time, file_hashes)
+                if child.is_dir:
+                    pending.append((child, child_copy))
+        return root
+
+    def __clone_note(self, last_modify_time: str, file_hashes: list) -> "Note":
+        """生成该结点本身的副本 (目录的副本的子结点字典是空的) , 参数同 `clone`."""
+        if self.is_dir:
+            content = None
+        else:
+            content = self.content
+            if not isinstance(content, str):
+                content = ''
+            if file_hashes is not None:
+                file_hashes.append(content)
+        metadata = _copy_metadata(self.metadata)
+        note = Note(self.is_dir, metadata, content)
+        if last_modify_time is not None:
+            metadata[_LAST_MODIFY_TIME] = last_modify_time
+        else:
+            note.pending_time = self.pending_time
+        return note
+
+    def settle_pending_time(self) -> None:
+        """把挂起的最后修改时间下推一层: 落实到各个子结点的元数据中, 并作为它们的挂起时间."""
+        pending_time = self.pending_time
+        if pending_time is None:
+            return
+        self.pending_time = None
+        last_modify_time = _LAST_MODIFY_TIME  # 循环中使用局部变量.
+        for child in self.content.values():
+            metadata = child.metadata
+            if metadata.get(last_modify_time, '') < pending_time:
+                metadata[last_modify_time] = pending_time
+            if child.is_dir and (child.pending_time is None or child.pending_time < pending_time):
+                child.pending_time = pending_time
+
+    def to_json(self) -> list:
+        """转换成 `json` 文件中的列表结构 (不递归, 子结点由 `json` 模块通过 `default` 参数逐个转换) .
+
+        Notes:
+            * `json` 模块总是先转换父结点再转换它的子结点, 所以在这里下推挂起的最后修改时间,
+              保存一次就能把所有挂起的时间落实下去, 不需要额外遍历.
+        """
+        if self._raw is not None and self.pending_time is None:  # 没有加载过的子树直接输出原来的结构.
+            return [True, self.metadata, self._raw]
+        self.settle_pending_time()
+        return [self.is_dir, self.metadata, self.content]
+
+
 # 主类
 class DirTreeHandler:
     """该类提供了对应于一个由本模块创建的 `json` 文件的目录树的各种处理.
@@ -123,19 +308,35 @@ class DirTreeHandler:
             raise FileNotFoundError(f"{json_path}所在的目录不存在")
         # 处理.
         self._json_path = json_path
-        self._dir_tree = [True, {}, {}]
+        self._log_path = json_path + LOG_FILE_SUFFIX
+        self._dir_tree = Note(True)
+        self._dirty = True  # 目录树是否有未保存的修改 (新建的目录树需要保存一次) .
+        self._ascii_only = True  # 目录树中是否确定只有 ASCII 字符 (不确定时为False, 见 `store_change`) .
+        self._snapshot_id = None  # 已保存的 `json` 文件的 (inode, 大小, 修改时间) , 修改日志只对这个文件有效.
+        self._log_size = 0  # 修改日志文件的大小 (为 None 时表示日志不可用, 下次保存时必须重写 `json` 文件) .
+        self._log_records = []  # 上次保存之后的修改的记录 (重放日志时为 None, 即不记录) .
+        self._replay_time = None  # 重放日志时使用的 (记录下来的) 时间.
         if os.path.exists(json_path):
             try:
-                with open(json_path, 'r', encoding="utf-8") as f:
-                    self._dir_tree = json.load(f)
+                with open(json_path, 'rb') as f:  # 一次读入全部字节, 由 `json.loads` 直接解码 (UTF-8) .
+                    raw = f.read()
+                    snapshot_id = self.__get_snapshot_id(f.fileno())
+                self._dir_tree = Note.from_json(json.loads(raw))
+                self._ascii_only = raw.isascii() and b'\\u' not in raw
+                self._snapshot_id = snapshot_id
+                self._dirty = False
             except json.JSONDecodeError:
                 pass
-        self._current_dir = self._dir_tree
-        self._current_dir_path = ['/']
-        self._old_dir = self._current_dir
-        self._old_dir_path = self._current_dir_path
+        self._current_dir_path = ('/',)  # 内部使用元组 (不可变, 可以直接共享, 也可以直接作为缓存的键) .
+        self._current_dir_stack = (self._dir_tree,)  # 从根结点到当前目录的结点, 和当前路径一一对应.
+        self._resolve_cache = OrderedDict()  # 路径解析缓存: 绝对路径元组 -> (目录树版本, 从根结点到该结点的结点元组).
+        self._negative_cache = OrderedDict()  # 不存在的路径的缓存: 绝对路径元组 -> 目录树版本.
+        self._tree_version = 0  # 目录树的结构版本, 每次结构上的修改都会使其增加.
         self.json_indent_zero = json_indent_zero
         self.json_sep_close = json_sep_close
+        # 在 `json` 文件的基础上重放修改日志 (需要上面的各个属性都已经初始化) .
+        if self._snapshot_id is not None:
+            self.__replay_log()
 
     def __enter__(self):
         return self
@@ -144,288 +345,279 @@ class DirTreeHandler:
         """在退出前保存所有的修改"""
         self.store_change()
 
-    def __save(self) -> None:
-        """保存当前目录和当前路径."""
-        self._old_dir = self._current_dir
-        self._old_dir_path = self._current_dir_path
-
-    def __backward(self) -> None:
-        """恢复当前目录和当前路径.
-
-        Warnings:
-            * 在调用该方法时, 需要特别注意self._old_dir_path对应的路径是存在的, 否则可能会导致后续发生严重的错误.
-
-        Notes:
-            * 使用该方法应该特别小心, 需要确保“前置条件”是满足的.
-            * 一般是在调用了“goto”方法后使用该方法, 以恢复切换“当前目录”之前所在的“当前目录”.
-            * 该方法能正常起到效果的基本前提是其他方法 (除了“goto”方法、_save方法、本方法和_set_state) 保证在被调用前后不改变self._old_dir、self._old_dir_path。
-              由于本模块要求self._current_dir、self._current_dir_path只能在“goto”方法和本方法调用前后改变, 在其他方法调用前后不变, 
-              所以实际上要求其他方法 (除了“goto”方法、_save方法、本方法和_set_state) 在调用前后不改变这四个成员变量的值.
-        """
-        self._current_dir = self._old_dir
-        self._current_dir_path = self._old_dir_path
-
-    def __get_state(self) -> tuple:
-        """获得当前状态的四元组."""
-        return self._old_dir, self._old_dir_path, self._current_dir, self._current_dir_path
-
-    def __set_state(self, state: tuple) -> None:
-        """设置当前状态
-
-        Warnings:
-            * 该方法必须和_get_state配套使用, 否则会破坏本模块的内部一致处理, 导致意料之外的效果.
-            * 该方法的在这里唯一合理的使用是, 在方法中改变“当前目录”之前 (或等效如此) 调用_get_state, 在该方法退出前调用_set_state.
-            * 注意, 这里传入的参数在后续应该丢弃 (因为该方法对它们产生了“副作用”) .
-        """
-        (self._old_dir, self._old_dir_path, self._current_dir, self._current_dir_path) = state
-
-    def __goto_dir(self, dir_path: list) -> bool:
-        """将当前目录切换到指定目录 (仅在内部使用) .
-
-        更新当前路径, 更新失败则当前目录和当前路径不变.
+    def __resolve_stack(self, path: list) -> Union[tuple, None]:
+        """解析指定路径, 得到从根结点到它对应的结点的所有结点 (仅在内部使用) .
 
         Notes:
-            * 这是本模块的核心方法 (判断路径是否存在也是以此为基础的) , 这里没有采用如果路径不存在则抛出异常的方法, 而是采用操作成功或者失败返回相应的bool值.
-            * 只要调用了该方法, 原来的self._old_dir、self._old_dir_path就被覆盖了.
-            * 调用该方法后, 再调用一次backward就能回到调用该方法前的“当前目录”.
-            * 如果该方法返回False, “当前目录”是不变的.
+            * 该方法不改变“当前目录”.
+            * 解析结果以绝对路径的元组为键做 LRU 缓存, 缓存项中记录了解析时的 self._tree_version,
+              版本不一致的缓存项视为未命中, 所以目录树的结构被修改后不需要逐项清理缓存.
+            * 修改元数据和散列值是在结点上原地进行的, 不会使缓存的结点引用失效, 所以不需要增加版本.
+            * 返回的结点元组和绝对路径一一对应 (根结点对应 '/') , 元组是不可变的, 可以直接共享.
+            * 不存在的路径也按同样的方式缓存 (self._negative_cache) , 反复查询不存在的路径 (比如创建前先检查) 时不需要再遍历.
 
         Args:
-            dir_path: 一个对应目录的路径.
+            path: 指定的路径, 可以是文件, 也可以是目录.
 
         Returns:
-            如果dir_path不存在或者存在但不是目录, 返回False.否则, 返回True.
+            如果指定的路径不存在, 返回None.否则, 返回 (结点元组, 绝对路径的元组) .
         """
-        self.__save()
-        if not dir_path:  # 对当前路径的处理.
-            return True
-        # 确定是绝对路径还是相对路径
-        if dir_path[0] == '/':
-            self._current_dir = self._dir_tree
-            self._current_dir_path = ['/']
-            index_begin = 1
+        path_absolute = self.__to_absolute_path(path)
+        cache = self._resolve_cache
+        entry = cache.get(path_absolute)
+        if entry is not None and entry[0] == self._tree_version:  # 命中缓存.
+            cache.move_to_end(path_absolute)
+            return entry[1], path_absolute
+        negative_cache = self._negative_cache
+        if negative_cache.get(path_absolute) == self._tree_version:  # 命中不存在的路径的缓存.
+            return None
+        # 未命中缓存, 则遍历一次目录树:
+        # 如果上层目录的解析结果在缓存中 (比如依次访问同一个目录中的各个结点) , 只需再查找最后一层;
+        # 否则, 相对路径从“当前目录”开始遍历, 绝对路径从根结点开始遍历.
+        parent_entry = cache.get(path_absolute[:-1]) if len(path_absolute) > 1 else None
+        if parent_entry is not None and parent_entry[0] == self._tree_version:
+            stack = list(parent_entry[1])
+            items = path_absolute[-1:]
+        elif path and path[0] == '/':
+            stack = [self._dir_tree]
+            items = path_absolute[1:]
         else:
-            index_begin = 0
-        # 更改当前目录到指定路径的目录, 更新当前路径, 更新失败则当前目录和当前路径不变
-        for item in dir_path[index_begin:]:  # 如果是根路径['/'], dir_path[index_begin:]是[], 是okay的.
-            if item in self._current_dir[NoteIndex.CONTENT.value].keys():
-                if not self._current_dir[NoteIndex.CONTENT.value][item][NoteIndex.IS_DIR.value]:
-                    self.__backward()
-                    return False
-                self._current_dir = self._current_dir[NoteIndex.CONTENT.value][item]
-                self._current_dir_path = self._current_dir_path + [item]
-            else:
-                self.__backward()
-                return False
-        return True
+            stack = list(self._current_dir_stack)
+            items = path
+        note = stack[-1]
+        append = stack.append
+        for item in items:
+            note = note.content.get(item) if note.is_dir else None
+            if note is None:
+                negative_cache[path_absolute] = self._tree_version
+                negative_cache.move_to_end(path_absolute)
+                if len(negative_cache) > NEGATIVE_CACHE_SIZE:
+                    negative_cache.popitem(last=False)
+                return None
+            append(note)
+        stack = tuple(stack)
+        cache[path_absolute] = (self._tree_version, stack)
+        cache.move_to_end(path_absolute)
+        if len(cache) > RESOLVE_CACHE_SIZE:
+            cache.popitem(last=False)
+        return stack, path_absolute
+
+    def __resolve(self, path: list) -> Union[tuple, None]:
+        """解析指定路径, 得到它对应的结点 (仅在内部使用) .
 
-    def __goto_path(self, path: list) -> Union[NoteType, bool]:
-        """将当前目录切换到指定路径的最后一个目录 (如果路径存在) .
+        Returns:
+            如果指定的路径不存在, 返回None.否则, 返回 (结点, 绝对路径的元组) .
+        """
+        resolved = self.__resolve_stack(path)
+        if resolved is None:
+            return None
+        return resolved[0][-1], resolved[1]
 
-        如果指定路径不存在, 则“当前目录”不变.
+    def __resolve_or_raise(self, path: list, note_type: NoteType = None) -> tuple:
+        """解析指定路径 (要求它存在, 并且可以要求它的类型) , 得到从根结点到它对应的结点的所有结点.
 
         Notes:
-            * 只要调用了该方法, 原来的self._old_dir、self._old_dir_path就被覆盖了.
-            * 调用该方法后, 再调用一次backward就能回到调用该方法前的“当前目录” (前提是它存在) .
-            * 如果该方法的返回值是False, 则调用该方法前后“当前目录”是不变的.
-            * 特别地, 它不仅通过 self.__save 来保存“当前目录” (
-              因为其内部还调用了 self.__goto_dir) , 而是在开头用局部变量保存“当前目录”, 
-              这是为了在调用 self.__goto_dir 后仍保持该方法的行为.
-            * 这个方法完全可以优化一下.
+            * 把“检查路径是否存在”和“找到对应的结点”合并成一次解析, 公有方法不需要先检查再切换“当前目录”.
 
         Args:
-            path: 指定的路径, 可以是文件, 也可以是目录.
+            path: 指定的路径.
+            note_type: 要求的结点类型, 为 None 时不做要求.
 
         Returns:
-            如果指定的路径不存在, 则返回False.如果指定的路径存在并且是目录 (不是目录) , 则返回NoteType.is_dir (NoteType.is_file) .特别的, 如果path是空的, 表示是当前目录, 此时返回NoteType.is_dir.
-        """
-        self.__save()
-        old_dir_tmp = self._old_dir  # 保存旧路径.
-        old_dir_path_tmp = self._old_dir_path
-
-        if not path:  # 对当前路径的处理.
-            return NoteType.IS_DIR
-        # 进入该路径所在的目录 (特别地, 如果该路径是根路径, 直接处理) .
-        if len(path) == 1:
-            if path[0] == '/':  # 绝对路径
-                self._current_dir = self._dir_tree
-                self._current_dir_path = ['/']
-                return NoteType.IS_DIR
-        else:
-            if not self.__goto_dir(path[:-1]):  # 注:当path的长度为1的时候, 这里的path[:-1]为[], 此时被调用方法返回True, 所以一切正常.
-                # 恢复路径.
-                self._old_dir = old_dir_tmp
-                self._old_dir_path = old_dir_path_tmp
-                self.__backward()
-                return False
-            else:
-                self._old_dir = old_dir_tmp  # 恢复旧路径.
-                self._old_dir_path = old_dir_path_tmp
-
-
-        # 判断该路径对应的是目录、文件还是不存在.
-        if path[-1] in self._current_dir[NoteIndex.CONTENT.value].keys():
-            if self._current_dir[NoteIndex.CONTENT.value][path[-1]][NoteIndex.IS_DIR.value]:
-                self._current_dir = self._current_dir[NoteIndex.CONTENT.value][path[-1]]
-                self._current_dir_path = self._current_dir_path + [path[-1]]
-                check_result = NoteType.IS_DIR
-            else:
-                check_result = NoteType.IS_FILE
-        else:
-            self.__backward()
-            check_result = False
-        return check_result
+            (结点元组, 绝对路径的元组) , 参见 self.__resolve_stack.
 
-    def __to_absolute_path(self, path: list) -> list:
-        """将路径转换成绝对路径."""
+        Raises:
+            PathNotExists: 如果该路径不存在.
+            PathIsNotDir: 如果要求是目录, 但该路径存在但不对应一个目录.
+            PathIsNotFile: 如果要求是文件, 但该路径存在但不对应一个文件 (而是一个目录) .
+        """
+        resolved = self.__resolve_stack(path)
+        if resolved is None:
+            raise PathNotExists(f"路径'{list(path)}'不存在")  # 路径也可以是元组, 这里统一按列表显示.
+        if note_type is NoteType.IS_DIR and not resolved[0][-1].is_dir:
+            raise PathIsNotDir(f"路径'{list(path)}'存在但不对应一个目录")
+        if note_type is NoteType.IS_FILE and resolved[0][-1].is_dir:
+            raise PathIsNotFile(f"路径'{list(path)}'存在但不对应一个文件 (而是一个目录) ")
+        return resolved
+
+    def __to_absolute_path(self, path: list) -> tuple:
+        """将路径转换成绝对路径 (元组) ."""
         if not path:  # 对当前路径的处理.
-            path_absolute = list(self._current_dir_path)
+            path_absolute = self._current_dir_path
         elif path[0] == '/':  # 对绝对路径的处理 (包括了根路径) .
-            path_absolute = list(path)
+            path_absolute = tuple(path)
         else:  # 对相对路径的处理.
-            path_absolute = self._current_dir_path + path
+            path_absolute = self._current_dir_path + tuple(path)
         return path_absolute
 
-    def __is_path_contained(self, container_path: list, contained_path: list) -> bool:
-        """检查container_path路径是不是包含contained_path路径.
+    @staticmethod
+    def __is_path_contained(container_absolute: tuple, contained_absolute: tuple) -> bool:
+        """检查绝对路径container_absolute是不是包含绝对路径contained_absolute.
+
+        Notes:
+            * 参数都必须是已经由 `__to_absolute_path` 化成的绝对路径的元组 (调用者对同一个路径只转换一次) .
+            * 先比较长度, 再用一次元组切片的比较判断前缀 (结点名称是驻留的字符串, 元素的比较一般只需比较引用) .
 
         Returns:
             如果包含, 返回True.反之, 返回False.
         """
-        # 化成绝对路径.
-        container_path = self.__to_absolute_path(container_path)
-        contained_path = self.__to_absolute_path(contained_path)
-        # 判断路径是否包含.
-        if contained_path == container_path[:len(contained_path)]:
-            return True
-        return False
+        length = len(contained_absolute)
+        return len(container_absolute) >= length and container_absolute[:length] == contained_absolute
 
-    @staticmethod
-    def __get_current_time() -> str:
+    __current_time_cache = (None, None)  # 最近一次格式化的 (Unix 时间的分钟数, 格式化的时间) .
+
+    @classmethod
+    def __get_current_time(cls) -> str:
         """获取当前时间并格式化为指定格式.
 
+        Notes:
+            * 格式化的时间只精确到分钟, 所以在同一分钟内直接返回上一次格式化的结果, 不再调用 `strftime`.
+
         Returns:
             返回格式化的当前时间.
         """
-        return datetime.now().strftime("%Y-%m-%d %H:%M")
+        minute = int(time.time() // 60)
+        cached_minute, cached_time = cls.__current_time_cache
+        if minute == cached_minute:
+            return cached_time
+        current_time = datetime.fromtimestamp(minute * 60).strftime("%Y-%m-%d %H:%M")
+        cls.__current_time_cache = (minute, current_time)
+        return current_time
 
-    def __update_parent_last_modified_time_recursively(self, path: list) -> None:
-        """对一个文件或目录的上层递归的维护修改时间 (不修改这个文件或目录的最后修改时间) .
+    @staticmethod
+    def __stamp_notes(notes: tuple, current_time: str) -> None:
+        """修改给定的各个结点的最后修改时间 (不包括它们的子结点) ."""
+        last_modify_time = _LAST_MODIFY_TIME  # 循环中使用局部变量.
+        for note in notes:
+            note.metadata[last_modify_time] = current_time
 
-        Notes:
-            * path如果对应'/', 不会做任何处理.
+    @staticmethod
+    def __stamp_subtree(note: Note, current_time: str) -> None:
+        """修改一个结点及其所有子结点的最后修改时间.
 
-        Raises:
-            PathNotExists: 如果该路径不存在, 则抛出此异常.
+        Notes:
+            * 不遍历子结点, 而是把时间挂起在该结点上 (见 `Note`) , 所以是 O(1) 的.
+            * 时间是单调的, 新挂起的时间不早于该结点原来的上层结点挂起的时间, 所以把结点移走时不需要带上它们.
         """
-        # 条件检查.
-        if not self.is_path_exists(path):
-            raise PathNotExists(f"路径'{path}'不存在")
-        # 保存原来的状态.
-        state = self.__get_state()
-        # 获取格式化的当前时间.
-        current_time = self.__get_current_time()
-        # 回到根节点.
-        self.__goto_dir(['/'])
-        # 递归地修改所属目录的最后修改时间
-        path = self.__to_absolute_path(path)
-        path = path[:-1]  # 如果path为根目录['/'], 这里的结果就是[], 是okay的.
-        for item in path:
-            self.__goto_dir([item])
-            self._current_dir[NoteIndex.METADATA.value][MetadataIndex.LAST_MODIFY_TIME.value] = current_time
-        # 恢复原来的状态
-        self.__set_state(state)
-
-    def __update_child_last_modified_time_recursively(self, dir_path: list) -> None:
-        """对一个目录的下层递归维护修改时间 (也会更新这个目录的最后修改时间) .
+        note.metadata[_LAST_MODIFY_TIME] = current_time
+        if note.is_dir:
+            note.pending_time = current_time
 
-        Raises:
-            PathNotExist: 如果该路径不存在.
-            PathIsNotDir: 如果该路径存在但不对应一个目录.
+    def __now(self) -> str:
+        """获取修改时使用的时间 (重放日志时是记录下来的时间, 否则是格式化的当前时间) ."""
+        if self._replay_time is not None:
+            return self._replay_time
+        return self.__get_current_time()
+
+    def __log(self, record: list) -> None:
+        """记录一次 (已经成功的) 修改, 保存时写入修改日志.
+
+        Notes:
+            * 记录是 `[操作, 时间, 参数...]`, 其中的路径都是绝对路径, 时间是修改时使用的时间 (没有时为 None) .
+              操作有: `'c'` (创建结点, 参数是路径和是否是目录) , `'h'` (设置散列值) , `'m'` (修改元数据) ,
+              `'v'` (移动) , `'p'` (复制) , `'d'` (删除) .
+            * 元数据字典是直接引用的, 在保存时才编码, 所以和同时保存的目录树是一致的.
         """
-        def update_child_last_modified_time_recursively_help(path: list) -> None:
-            """一个内部函数, 对一个目录的下层递归维护修改时间的辅助函数.
-
-            前置条件:
-                -该路径必须存在并且对应一个目录, 否则会导致错误.
-                -其外部函数在调用该函数前应该已经定义格式化的当前时间current_time.
-
-            Notes:
-                * 这里的设计需十分小心.
-                * 这里不保证原来的 self.__old_dir、self.__old_dir_path 不变.
-            """
-            # 保存当前路径.
-            current_dir_tmp = self._current_dir
-            current_dir_path_tmp = self._current_dir_path
-
-            # 获得当前目录结点
-            self.__goto_dir(path)
-            current_dir = self._current_dir  # 这是重要的, 因为在遍历子结点的时候”当前目录“被修改, 如果直接使用self._current_dir会导致错误 (也显得十分混乱) .
-            # 修改本目录的的最后修改时间
-            current_dir[NoteIndex.METADATA.value][MetadataIndex.LAST_MODIFY_TIME.value] = current_time
-            # 递归地修改子结点的最后修改时间
-            for name, item in current_dir[NoteIndex.CONTENT.value].items():
-                if item[NoteIndex.IS_DIR.value]:  # 如果是一个目录, 递归调用自己
-                    update_child_last_modified_time_recursively_help([name])
-                else:  # 否则, 直接修改该文件的最后修改时间
-                    item[NoteIndex.METADATA.value][MetadataIndex.LAST_MODIFY_TIME.value] = current_time
-
-            # 恢复当前路径
-            self._current_dir = current_dir_tmp  # 这是相当重要的, 如果没有这个操作, 比如目录A中有目录B和目录C (其中有文件d) , 处理目录B之后, 当前目录变成了目录B, 于是在处理目录C的时候就会出错.
-            self._current_dir_path = current_dir_path_tmp
+        if self._log_records is not None:
+            self._log_records.append(record)
 
-        # 条件检查.
-        tmp = self.__goto_path(dir_path)
-        if not tmp:
-            raise PathNotExists(f"路径'{dir_path}'不存在")
-        if tmp != NoteType.IS_DIR:
-            self.__backward()
-            raise PathIsNotDir(f"路径'{dir_path}'存在但不对应一个目录")
-        self.__backward()
-        # 保存原来的状态
-        state = self.__get_state()
-        # 获取格式化的当前时间
-        current_time = self.__get_current_time()
-        # 递归地修改子结点的最后修改时间
-        update_child_last_modified_time_recursively_help(dir_path)
-        # 恢复原来的状态
-        self.__set_state(state)
+    @staticmethod
+    def __get_snapshot_id(fd: int) -> list:
+        """获取一个已打开的 `json` 文件的标识 (inode, 大小, 修改时间) , 每次重写这个文件都会使其改变."""
+        file_stat = os.fstat(fd)
+        return [file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns]
 
-    def __create_note(self, path: list, note_type: NoteType = NoteType.IS_DIR) -> None:
+    def __replay_log(self) -> None:
+        """在刚加载的目录树上重放修改日志.
+
+        Notes:
+            * 日志的第一行是它所对应的 `json` 文件的标识, 和现在的 `json` 文件不一致时说明日志已经过时
+              (比如重写了 `json` 文件但还没来得及删除日志) , 直接删除它.
+            * 遇到不完整 (比如写入时中断) 或者不能重放的记录时停止, 并在下次保存时重写 `json` 文件.
+        """
+        try:
+            with open(self._log_path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return
+        lines = raw.split(b'\n')
+        try:
+            is_valid = json.loads(lines[0]) == {'snapshot': self._snapshot_id}
+        except ValueError:
+            is_valid = False
+        if not is_valid:
+            os.remove(self._log_path)
+            return
+        operations = {
+            'c': lambda path, is_dir: self.__create_note(path, NoteType.IS_DIR if is_dir else NoteType.IS_FILE),
+            'h': self.set_file_hash,
+            'm': self.modify_metadata_of_path,
+            'v': self.move,
+            'p': self.copy,
+            'd': self.delete,
+        }
+        self._log_records = None  # 重放时不记录.
+        try:
+            for line in lines[1:-1]:  # 完整的记录都以换行符结束, 最后一项是空的 (或者是不完整的记录) .
+                operation, self._replay_time, *args = json.loads(line)
+                operations[operation](*args)
+            if lines[-1]:
+                raise ValueError("修改日志的最后一条记录不完整")
+            self._log_size = len(raw)
+        except (ValueError, TypeError, KeyError, FileSystemError):
+            self._log_size = None
+            self._dirty = True
+        finally:
+            self._replay_time = None
+            self._log_records = []
+
+    def __create_note(self, path: list, note_type: NoteType = NoteType.IS_DIR, hash_value: str = None) -> None:
         """创建一个结点 (覆盖式的) .
 
         Args:
             path: 指定创建结点的路径.
             note_type: 创建结点的类型.
+            hash_value: 如果不为 None, 同时设置新建的文件的散列值 (见 `create_file`) .
 
         Raises:
-            InvalidCurrentDirOperation: 如果该路径对应当前路径.
+            InvalidCurrentDirOperation: 如果该路径对应当前路径, 或当前路径包含该路径.
             InvalidNamingConventionError: 如果待创建结点的名称是空的或者其中包含“/”.
             DirOfPathNotExists: 如果该路径所在的目录是不存在的.
         """
         # 条件检查.
-        state = self.__get_state()
         if not path:  # 不能创建路径为根路径的结点
             raise InvalidCurrentDirOperation("尝试创建路径为当前路径的结点, 但这是不允许的")
         if not path[-1]:  # 待创建的结点名称不能是空的.
             raise InvalidNamingConvention("待创建结点的名称不能是空的")
         if '/' in path[-1]:  # 待创建的结点名称不能是'/'.
             raise InvalidNamingConvention("待创建结点的名称中包含“/”")
-        if not self.__goto_dir(path[:-1]):
+        if self.__is_path_contained(self._current_dir_path, self.__to_absolute_path(path)):  # 不能覆盖当前路径所在的结点.
+            raise InvalidCurrentDirOperation(f"当前路径包含待创建结点的路径'{path}', 这是不允许的")
+        dir_resolved = self.__resolve_stack(path[:-1])
+        if dir_resolved is None or not dir_resolved[0][-1].is_dir:
             raise DirOfPathNotExists(f"路径'{path}'所在的目录不存在")
 
-        if note_type is NoteType.IS_DIR:
-            self._current_dir[NoteIndex.CONTENT.value][path[-1]] = [True, {}, {}]
-        else:
-            self._current_dir[NoteIndex.CONTENT.value][path[-1]] = [False, {}, {}]
         # 获取格式化的当前时间
-        current_time = self.__get_current_time()
-        # 修改这个结点的创建时间和最后修改时间
-        self._current_dir[NoteIndex.CONTENT.value][path[-1]][NoteIndex.METADATA.value][MetadataIndex.CREATE_TIME.value] = current_time
-        self._current_dir[NoteIndex.CONTENT.value][path[-1]][NoteIndex.METADATA.value][MetadataIndex.LAST_MODIFY_TIME.value] = current_time
+        current_time = self.__now()
+        # 创建结点, 并设置它的创建时间和最后修改时间
+        note = Note(note_type is NoteType.IS_DIR, {_CREATE_TIME: current_time, _LAST_MODIFY_TIME: current_time})
+        dir_stack = dir_resolved[0]
+        dir_stack[-1].content[sys.intern(path[-1])] = note
+        if not path[-1].isascii():
+            self._ascii_only = False
+        self._tree_version += 1  # 可能覆盖了原有的结点, 使路径解析缓存失效.
         # 递归修改最后修改时间
-        self.__update_parent_last_modified_time_recursively([path[-1]])
-        self.__set_state(state)
+        self.__stamp_notes(dir_stack, current_time)
+        self._dirty = True
+        path_absolute = list(dir_resolved[1]) + [path[-1]]
+        self.__log(['c', current_time, path_absolute, note_type is NoteType.IS_DIR])
+        if hash_value is not None:  # 和 `set_file_hash` 的效果 (包括记录) 相同, 只是不用再解析一次路径.
+            if type(hash_value) is str:
+                hash_value = sys.intern(hash_value)
+            note.content = hash_value
+            if not (isinstance(hash_value, str) and hash_value.isascii()):
+                self._ascii_only = False
+            self.__log(['h', None, path_absolute, hash_value])
 
     # 提供给外部的方法
     def store_change(self) -> None:
@@ -433,10 +625,22 @@ class DirTreeHandler:
 
         Notes:
             * 根据参数的设置, 来确定将目录树保存成json的格式.
-            * 默认为原始字符写入 (即在json.dump中ensure_ascii为False, 这在UTF-8编码下是更节省空间的) 
-        Args:
-
+            * 默认为原始字符写入 (即在json.dumps中ensure_ascii为False, 这在UTF-8编码下是更节省空间的) 
+            * 先用 `json.dumps` 一次性编码再整体写入, 而不是用 `json.dump`:
+              后者总是使用纯 Python 实现的编码器并逐块写入, 前者在 indent 为 None 时使用 C 实现的编码器.
+            * 如果目录树在上次保存 (或加载) 后没有被修改, 则什么都不做.
+            * 先写入同目录下的临时文件, 再用 `os.replace` 替换原文件, 这样即使写入时中断也不会损坏原文件.
+            * 编码成 UTF-8 的字节后以二进制模式一次写入, 不经过文本模式的逐块编码和换行符转换.
+            * 如果确定目录树中只有 ASCII 字符, 就使用 ensure_ascii 为 True 的 (更快的) 编码, 两者的结果是一样的.
+              各个修改方法遇到非 ASCII 字符 (或者不确定) 时会清除这个标记, 保存时再根据编码的结果重新确定.
+            * 如果已经有保存的 `json` 文件, 通常只把上次保存之后的修改追加到修改日志中 (与目录树的大小无关) ,
+              下次加载时再重放它们; 日志太大 (见 `LOG_COMPACT_RATIO`) 时才重写整个 `json` 文件并删除日志.
         """
+        if not self._dirty:
+            return
+        if self.__append_log():
+            self._dirty = False
+            return
         if self.json_indent_zero:
             indent = None
         else:
@@ -445,25 +649,53 @@ class DirTreeHandler:
             separators = (',', ':')
         else:
             separators = (', ', ': ')
-        with open(self._json_path, "w", encoding='utf-8') as f:
-            json.dump(self._dir_tree, f, ensure_ascii=False, indent=indent, separators=separators)
+        data = json.dumps(self._dir_tree, ensure_ascii=self._ascii_only, indent=indent, separators=separators, default=Note.to_json)
+        if not self._ascii_only:
+            self._ascii_only = data.isascii()
+        tmp_path = self._json_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data.encode('utf-8'))
+            f.flush()
+            snapshot_id = self.__get_snapshot_id(f.fileno())
+        os.replace(tmp_path, self._json_path)
+        # 新的 `json` 文件已经包含了所有的修改, 日志作废 (先替换再删除, 中断时留下的日志也会因为标识不一致而被忽略) .
+        self._snapshot_id = snapshot_id
+        if self._log_size != 0:
+            try:
+                os.remove(self._log_path)
+            except FileNotFoundError:
+                pass
+        self._log_size = 0
+        self._log_records = []
+        self._dirty = False
+
+    def __append_log(self) -> bool:
+        """把上次保存之后的修改追加到修改日志中.
+
+        Returns:
+            如果追加了, 返回 True. 如果不能 (或不应该) 追加, 返回 False, 这时应当重写整个 `json` 文件.
+        """
+        if self._snapshot_id is None or self._log_size is None or not self._log_records:
+            return False
+        data = ''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+                       for record in self._log_records).encode('utf-8')
+        if self._log_size == 0:  # 新的日志先写入它所对应的 `json` 文件的标识.
+            data = (json.dumps({'snapshot': self._snapshot_id}) + '\n').encode('utf-8') + data
+        if self._log_size + len(data) > self._snapshot_id[1] * LOG_COMPACT_RATIO:
+            return False
+        with open(self._log_path, 'ab') as f:
+            f.write(data)
+        self._log_size += len(data)
+        self._log_records = []
+        return True
 
     def get_current_dir_path(self) -> list:
         """返回当前目录路径."""
-        return self._current_dir_path
+        return list(self._current_dir_path)
 
     def is_path_exists(self, path: list) -> bool:
         """查询指定路径的文件或目录是否存在."""
-        # 保存原来的状态.
-        state = self.__get_state()
-
-        if not self.__goto_path(path):
-            return False
-        #self.__backward()
-
-        # 恢复原来的状态
-        self.__set_state(state)
-        return True
+        return self.__resolve(path) is not None
 
     def chdir(self, dir_path: list) -> None:
         """切换当前目录 (提供给外部使用) .
@@ -481,31 +713,26 @@ class DirTreeHandler:
             PathNotExists: 如果该路径不存在.
             PathIsNotDir: 如果该路径存在但不对应一个目录.
         """
-        tmp = self.__goto_path(dir_path)
-        if not tmp:
-            raise PathNotExists(f"路径'{dir_path}'不存在")
-        if tmp != NoteType.IS_DIR:
-            self.__backward()
-            raise PathIsNotDir(f"路径'{dir_path}'存在但不对应一个目录")
+        self._current_dir_stack, self._current_dir_path = self.__resolve_or_raise(dir_path, NoteType.IS_DIR)
 
     def get_metadata_of_path(self, path: list) -> dict:
         """查看指定路径的文件或目录的元数据.
 
         Notes:
-            * 这里返回的之所以是深拷贝而不是浅拷贝, 是因为我们之后可能会在“元数据”中加入更复杂的东西, 而不只是字符串.
+            * 这里返回的是独立的副本: 元数据的值都不可变时是浅拷贝, 否则是深拷贝 (见 `_copy_metadata`) .
 
         Raises:
             PathNotExists: 如果该路径不存在.
         """
-        tmp = self.__goto_path(path)
-        if not tmp:
-            raise PathNotExists(f"路径'{path}'不存在")
-        if tmp is NoteType.IS_DIR:
-            result = self._current_dir[NoteIndex.METADATA.value]
-        else:
-            result = self._current_dir[NoteIndex.CONTENT.value][path[-1]][NoteIndex.METADATA.value]
-        self.__backward()
-        return copy.deepcopy(result)
+        stack = self.__resolve_or_raise(path)[0]
+        metadata = _copy_metadata(stack[-1].metadata)
+        # 考虑上层结点挂起的最后修改时间 (见 `Note`) .
+        pending_times = [note.pending_time for note in stack[:-1] if note.pending_time is not None]
+        if pending_times:
+            pending_time = max(pending_times)
+            if metadata.get(_LAST_MODIFY_TIME, '') < pending_time:
+                metadata[_LAST_MODIFY_TIME] = pending_time
+        return metadata
 
     def modify_metadata_of_path(self, path: list, metadata: dict) -> None:
         """修改指定路径的文件或目录的元数据.
@@ -513,25 +740,20 @@ class DirTreeHandler:
         Raises:
             PathNotExists: 如果该路径不存在.
         """
-        tmp = self.__goto_path(path)
-        if not tmp:
-            raise PathNotExists(f"路径'{path}'不存在")
-        current_time = self.__get_current_time()  # 获取格式化的当前时间
-        if tmp is NoteType.IS_DIR:
-            # 修改元数据并维护修改时间
-            create_time = self._current_dir[NoteIndex.METADATA.value][MetadataIndex.CREATE_TIME.value]
-            self._current_dir[NoteIndex.METADATA.value] = metadata
-            self._current_dir[NoteIndex.METADATA.value][MetadataIndex.CREATE_TIME.value] = create_time
-            self._current_dir[NoteIndex.METADATA.value][MetadataIndex.LAST_MODIFY_TIME.value] = current_time
-        else:
-            # 修改元数据并维护修改时间
-            create_time = self._current_dir[NoteIndex.CONTENT.value][path[-1]][NoteIndex.METADATA.value][MetadataIndex.CREATE_TIME.value]
-            self._current_dir[NoteIndex.CONTENT.value][path[-1]][NoteIndex.METADATA.value] = metadata
-            self._current_dir[NoteIndex.CONTENT.value][path[-1]][NoteIndex.METADATA.value][MetadataIndex.CREATE_TIME.value] = create_time
-            self._current_dir[NoteIndex.CONTENT.value][path[-1]][NoteIndex.METADATA.value][MetadataIndex.LAST_MODIFY_TIME.value] = current_time
-        # 递归修改最后修改时间
-        self.__update_parent_last_modified_time_recursively(path)
-        self.__backward()
+        stack, path_absolute = self.__resolve_or_raise(path)
+        note = stack[-1]
+        current_time = self.__now()  # 获取格式化的当前时间
+        # 修改元数据并维护修改时间
+        create_time = note.metadata[_CREATE_TIME]
+        note.metadata = metadata
+        note.metadata[_CREATE_TIME] = create_time
+        note.metadata[_LAST_MODIFY_TIME] = current_time
+        # 递归修改最后修改时间 (上层结点直接取自解析得到的结点元组)
+        self.__stamp_notes(stack[:-1], current_time)
+        if self._ascii_only and not _is_ascii_metadata(metadata):
+            self._ascii_only = False
+        self._dirty = True
+        self.__log(['m', current_time, list(path_absolute), metadata])
 
     def get_dir_content(self, dir_path: list) -> list:
         """查看指定路径的目录的内容.
@@ -543,15 +765,63 @@ class DirTreeHandler:
             PathNotExists: 如果该路径不存在.
             PathIsNotDir: 如果该路径存在但不对应一个目录.
         """
-        tmp = self.__goto_path(dir_path)
-        if not tmp:
-            raise PathNotExists(f"路径'{dir_path}'不存在")
-        if tmp != NoteType.IS_DIR:
-            self.__backward()
-            raise PathIsNotDir(f"路径'{dir_path}'存在但不对应一个目录")
-        result = list(self._current_dir[NoteIndex.CONTENT.value].keys())
-        self.__backward()
-        return result
+        return list(self.__resolve_or_raise(dir_path, NoteType.IS_DIR)[0][-1].content)
+
+    def walk(self, dir_path: list):
+        """像 `os.walk` 一样自顶向下地遍历指定路径的目录 (包括它自己) .
+
+        Notes:
+            * 只解析一次指定路径, 之后直接遍历结点, 而不是对每个结点都从根结点 (或当前目录) 开始解析.
+            * 遍历的过程中不要修改这棵子树.
+
+        Yields:
+            (相对于该目录的列表路径, 子目录名的列表, (文件名, 散列值) 的列表) , 没有散列值的文件对应的散列值是 None.
+
+        Raises:
+            PathNotExists: 如果该路径不存在.
+            PathIsNotDir: 如果该路径存在但不对应一个目录.
+        """
+        pending = [([], self.__resolve_or_raise(dir_path, NoteType.IS_DIR)[0][-1])]  # 待遍历的 (相对路径, 目录结点) .
+        while pending:
+            relative_path, note = pending.pop()
+            dir_names, files = [], []
+            for name, child in note.content.items():
+                if child.is_dir:
+                    dir_names.append(name)
+                else:
+                    files.append((name, child.content or None))
+            yield relative_path, dir_names, files
+            # 按目录中的顺序遍历子目录.
+            pending.extend((relative_path + [name], note.content[name]) for name in reversed(dir_names))
+
+    def iter_files(self, dir_path: list):
+        """深度优先地遍历指定路径的目录中的所有文件 (包括子目录中的) , 顺序和逐层地按目录中的顺序递归遍历的一样.
+
+        Notes:
+            * 只解析一次指定路径, 之后直接遍历结点 (用一个迭代器的栈, 而不是递归) .
+            * 遍历的过程中不要修改这棵子树.
+
+        Yields:
+            (相对于该目录的列表路径的元组, 散列值) , 没有散列值的文件对应的散列值是 None.
+
+        Raises:
+            PathNotExists: 如果该路径不存在.
+            PathIsNotDir: 如果该路径存在但不对应一个目录.
+        """
+        note = self.__resolve_or_raise(dir_path, NoteType.IS_DIR)[0][-1]
+        names = []  # 正在遍历的各层子目录的名称 (比迭代器的栈少一层) .
+        pending = [iter(note.content.items())]
+        while pending:
+            for name, child in pending[-1]:
+                if child.is_dir:  # 先遍历子目录, 之后再继续遍历这一层.
+                    names.append(name)
+                    pending.append(iter(child.content.items()))
+                    break
+                yield (*names, name), child.content or None
+            else:  # 这一层遍历完了.
+                pending.pop()
+                if names:
+                    names.pop()
 
     def get_file_hash(self, file_path: list) -> str:
         """查看指定路径的文件的散列值.
@@ -564,16 +834,9 @@ class DirTreeHandler:
             PathIsNotFile: 如果该路径存在但不对应一个文件 (而是一个目录) .
             FileIDNotFound: 如果该路径存在且是一个文件但没有file_id.
         """
-        tmp = self.__goto_path(file_path)
-        if not tmp:
-            raise PathNotExists(f"路径'{file_path}'不存在")
-        if tmp is NoteType.IS_DIR:
-            self.__backward()
-            raise PathIsNotFile(f"路径'{file_path}'存在但不对应一个文件 (而是一个目录) ")
-        result = self._current_dir[NoteIndex.CONTENT.value][file_path[-1]][NoteIndex.CONTENT.value]
-        self.__backward()
+        result = self.__resolve_or_raise(file_path, NoteType.IS_FILE)[0][-1].content
         if not result:
-            raise FileIDNotFound(f"路径'{file_path}'存在且是一个文件但没有file_id")
+            raise FileIDNotFound(f"路径'{list(file_path)}'存在且是一个文件但没有file_id")
         return result
 
     def set_file_hash(self, file_path: list, hash_value: str) -> None:
@@ -583,125 +846,148 @@ class DirTreeHandler:
             PathNotExists: 如果该路径不存在.
             PathIsNotFile: 如果该路径存在但不对应一个文件 (而是一个目录) .
         """
-        tmp = self.__goto_path(file_path)
-        if not tmp:
-            raise PathNotExists(f"路径'{file_path}'不存在")
-        if tmp is NoteType.IS_DIR:
-            self.__backward()
-            raise PathIsNotFile(f"路径'{file_path}'存在但不对应一个文件 (而是一个目录) ")
-        self._current_dir[NoteIndex.CONTENT.value][file_path[-1]][NoteIndex.CONTENT.value] = hash_value
-        self.__backward()
+        stack, path_absolute = self.__resolve_or_raise(file_path, NoteType.IS_FILE)
+        if type(hash_value) is str:  # `sys.intern` 只接受 `str` 本身 (不接受它的子类) .
+            hash_value = sys.intern(hash_value)
+        stack[-1].content = hash_value
+        if not (isinstance(hash_value, str) and hash_value.isascii()):
+            self._ascii_only = False
+        self._dirty = True
+        self.__log(['h', None, list(path_absolute), hash_value])
 
     def move(self, src_path: list, dst_path: list) -> None:
         """移动一个文件或目录 (覆盖式的)  (这就包括了重命名) .
 
+        Notes:
+            * 如果源路径和目标路径在同一个目录中 (即重命名) , 只更新被移动的结点及其上层结点的最后修改时间,
+              不再遍历它的子结点.
+
         Args:
             src_path: 源文件或目录的路径.
             dst_path: 目标路径 (包含了目标名称) .
 
         Raises:
             InvalidOperation: 如果目标路径包含源路径.
-            InvalidCurrentDirOperation: 如果源路径或者目标路径是当前路径, 或当前路径包含源路径.
-            PathNotExists: 如果源路径不存在, 或目标路径所在的目录不存在.
+            InvalidCurrentDirOperation: 如果源路径或者目标路径是当前路径, 或当前路径包含源路径或目标路径.
+            PathNotExists: 如果源路径不存在, 或目标路径所在的目录不存在 (或不是一个目录) .
             InvalidNamingConvention: 如果待创建的结点的名称是空的或者其中包含'/'.
         """
         # 条件检查.
-        if self.__is_path_contained(dst_path, src_path):  # 如果目标路径包含源路径;
+        src_absolute = self.__to_absolute_path(src_path)
+        dst_absolute = self.__to_absolute_path(dst_path)
+        if self.__is_path_contained(dst_absolute, src_absolute):  # 如果目标路径包含源路径;
             raise InvalidOperation(f"在移动操作中, 目标路径'{dst_path}'包含源路径'{src_path}', 这是不允许的")
-        if self.__is_path_contained([], src_path):  # 如果当前路径包含源路径.
+        if self.__is_path_contained(self._current_dir_path, src_absolute):  # 如果当前路径包含源路径.
             raise InvalidCurrentDirOperation(f"在移动操作中, 当前路径包含源路径'{src_path}', 这是不允许的")
+        if self.__is_path_contained(self._current_dir_path, dst_absolute):  # 如果当前路径包含目标路径.
+            raise InvalidCurrentDirOperation(f"在移动操作中, 当前路径包含目标路径'{dst_path}', 这是不允许的")
         if (not src_path) or (not dst_path):  # 如果源路径或者目标路径是当前路径.
             raise InvalidCurrentDirOperation(f"在移动操作中, 源路径'{src_path}'或者目标路径'{dst_path}'是当前路径, 这是不允许的")
-        if (not self.is_path_exists(src_path)) or (not self.is_path_exists(dst_path[:-1])):  # 如果目标路径所在的目录或源路径不存在.
+        src_resolved = self.__resolve_stack(src_path)
+        dst_dir_resolved = self.__resolve_stack(dst_path[:-1])
+        if src_resolved is None or dst_dir_resolved is None or not dst_dir_resolved[0][-1].is_dir:  # 如果目标路径所在的目录或源路径不存在.
             raise PathNotExists(f"在移动操作中, 源路径'{src_path}'或者目标路径'{dst_path}'所在的目录不存在")
         if not dst_path[-1]:  # 带创建的结点的名称不能是空的.
             raise InvalidNamingConvention("带创建的结点的名称不能是空的")
         if '/' in dst_path[-1]:  # 待创建的结点名称不能包含'/'.
             raise InvalidNamingConvention("待创建结点的名称中不能包含'/'")
 
-        # 保存原来的状态
-        state = self.__get_state()
         # 获取格式化的当前时间.
-        current_time = self.__get_current_time()
-        # 获取源结点.
-        self.__goto_dir(src_path[:-1])
-        self.__update_parent_last_modified_time_recursively([src_path[-1]])  # 对源路径向上递归更新最后修改时间.
-        note_tmp = self._current_dir[NoteIndex.CONTENT.value].pop(src_path[-1])
-        self.__backward()
-        # 将源结点增加到目标路径所在的目录中.
-        self.__goto_dir(dst_path[:-1])
-        self._current_dir[NoteIndex.CONTENT.value][dst_path[-1]] = note_tmp
-        self.__update_parent_last_modified_time_recursively([dst_path[-1]])  # 对目标路径向上递归更新最后修改时间.
-        if note_tmp[NoteIndex.IS_DIR.value]:  # 如果它是一个目录, 向下递归更新最后修改时间.否则只需更新该文件的最后修改时间.
-            self.__update_child_last_modified_time_recursively([dst_path[-1]])
-        else:
-            note_tmp[NoteIndex.METADATA.value][MetadataIndex.LAST_MODIFY_TIME.value] = current_time
-        # self.__backward()
-        # 恢复原来的状态
-        self.__set_state(state)
-
-    def copy(self, src_path: list, dst_path: list) -> None:
+        current_time = self.__now()
+        src_stack = src_resolved[0]
+        if src_absolute[:-1] == dst_absolute[:-1]:  # 如果源路径和目标路径在同一个目录中 (即重命名) .
+            # 只改变结点在目录中的名称, 子结点没有变化, 所以不需要向下递归更新最后修改时间.
+            dir_content = src_stack[-2].content
+            note_tmp = dir_content.pop(src_absolute[-1])
+            dir_content[sys.intern(dst_path[-1])] = note_tmp
+            if not dst_path[-1].isascii():
+                self._ascii_only = False
+            self._tree_version += 1  # 使路径解析缓存失效.
+            self.__stamp_notes(src_stack, current_time)
+            self._dirty = True
+            self.__log(['v', current_time, list(src_absolute), list(dst_absolute)])
+            return
+        # 取出源结点, 并对源路径向上递归更新最后修改时间.
+        self.__stamp_notes(src_stack[:-1], current_time)
+        note_tmp = src_stack[-2].content.pop(src_absolute[-1])
+        # 将源结点增加到目标路径所在的目录中, 并对目标路径向上递归更新最后修改时间.
+        dst_dir_stack = dst_dir_resolved[0]
+        dst_dir_stack[-1].content[sys.intern(dst_path[-1])] = note_tmp
+        if not dst_path[-1].isascii():
+            self._ascii_only = False
+        self._tree_version += 1  # 使路径解析缓存失效.
+        self.__stamp_notes(dst_dir_stack, current_time)
+        # 更新它及其所有子结点的最后修改时间 (子结点的是挂起的) .
+        self.__stamp_subtree(note_tmp, current_time)
+        self._dirty = True
+        self.__log(['v', current_time, list(src_absolute), list(dst_absolute)])
+
+    def copy(self, src_path: list, dst_path: list, file_hashes: list = None) -> None:
         """复制一个文件或目录 (复制是覆盖式的) .
 
         Args:
             src_path: 源文件或目录的路径.
             dst_path: 目标路径 (包含了目标名称) .
+            file_hashes: 如果不为 None, 把复制得到的所有文件的散列值 (没有散列值的是空字符串) 依次追加到其中.
 
         Raises:
             InvalidOperation: 如果目标路径包含源路径.
-            InvalidCurrentDirOperation: 如果源路径或者目标路径是当前路径.
-            PathNotExists: 如果源路径不存在, 或目标路径所在的目录不存在.
+            InvalidCurrentDirOperation: 如果源路径或者目标路径是当前路径, 或当前路径包含目标路径.
+            PathNotExists: 如果源路径不存在, 或目标路径所在的目录不存在 (或不是一个目录) .
             InvalidNamingConvention: 如果待创建的结点的名称是空的或者其中包含'/'.
         """
         # 条件检查.
-        if self.__is_path_contained(dst_path, src_path):  # 如果目标路径包含源路径.
+        src_absolute = self.__to_absolute_path(src_path)
+        dst_absolute = self.__to_absolute_path(dst_path)
+        if self.__is_path_contained(dst_absolute, src_absolute):  # 如果目标路径包含源路径.
             raise InvalidOperation(f"在移动操作中, 目标路径'{dst_path}'包含源路径'{src_path}', 这是不允许的")
         if (not src_path) or (not dst_path):  # 如果源路径或者目标路径是当前路径.
             raise InvalidCurrentDirOperation(f"在移动操作中, 源路径'{src_path}'或者目标路径'{dst_path}'是当前路径, 这是不允许的")
-        if (not self.is_path_exists(src_path)) or (not self.is_path_exists(dst_path[:-1])):  # 如果源路径或目标路径不存在.
+        if self.__is_path_contained(self._current_dir_path, dst_absolute):  # 如果当前路径包含目标路径.
+            raise InvalidCurrentDirOperation(f"在复制操作中, 当前路径包含目标路径'{dst_path}', 这是不允许的")
+        src_resolved = self.__resolve_stack(src_path)
+        dst_dir_resolved = self.__resolve_stack(dst_path[:-1])
+        if src_resolved is None or dst_dir_resolved is None or not dst_dir_resolved[0][-1].is_dir:  # 如果源路径或目标路径不存在.
             raise PathNotExists(f"在移动操作中, 源路径'{src_path}'或者目标路径'{dst_path}'不存在")
         if not dst_path[-1]:  # 带创建的结点的名称不能是空的.
             raise InvalidNamingConvention("带创建的结点的名称不能是空的")
         if '/' in dst_path[-1]:  # 待创建的结点名称不能包含'/'.
             raise InvalidNamingConvention("待创建结点的名称中不能包含'/'")
 
-        # 保存原来的状态
-        state = self.__get_state()
         # 获取格式化的当前时间.
-        current_time = self.__get_current_time()
-        # 获取源结点.
-        self.__goto_dir(src_path[:-1])
-        note_tmp = copy.deepcopy(self._current_dir[NoteIndex.CONTENT.value][src_path[-1]])  # 生成独立的副本.
-        self.__backward()
-        # 将源结点增加到目标路径所在的目录中.
-        self.__goto_dir(dst_path[:-1])
-        self._current_dir[NoteIndex.CONTENT.value][dst_path[-1]] = note_tmp
-        self.__update_parent_last_modified_time_recursively([dst_path[-1]])  # 对目标路径向上递归更新最后修改时间.
-        if note_tmp[NoteIndex.IS_DIR.value]:  # 如果它是一个目录, 向下递归更新最后修改时间.否则只需更新该文件的最后修改时间.
-            self.__update_child_last_modified_time_recursively([dst_path[-1]])
-        else:
-            note_tmp[NoteIndex.METADATA.value][MetadataIndex.LAST_MODIFY_TIME.value] = current_time
-        # self.__backward()
-        # 恢复原来的状态
-        self.__set_state(state)
+        current_time = self.__now()
+        # 生成源结点的独立副本 (同时更新副本中所有结点的最后修改时间) .
+        note_tmp = src_resolved[0][-1].clone(current_time, file_hashes)
+        # 将副本增加到目标路径所在的目录中, 并对目标路径向上递归更新最后修改时间.
+        dst_dir_stack = dst_dir_resolved[0]
+        dst_dir_stack[-1].content[sys.intern(dst_path[-1])] = note_tmp
+        if not dst_path[-1].isascii():
+            self._ascii_only = False
+        self._tree_version += 1  # 可能覆盖了原有的结点, 使路径解析缓存失效.
+        self.__stamp_notes(dst_dir_stack, current_time)
+        self._dirty = True
+        self.__log(['p', current_time, list(src_absolute), list(dst_absolute)])
 
     def delete(self, path: list) -> None:
         """删除一个文件或目录.
 
         Raises:
-            InvalidCurrentDirOperation: 如果该路径是当前路径.
+            InvalidCurrentDirOperation: 如果该路径是当前路径, 或当前路径包含该路径.
             PathNotExists: 如果该路径不存在.
         """
         # 条件检查.
         if not path:  # 如果该路径是当前路径.
             raise InvalidCurrentDirOperation("在删除操作中, 待删除路径是当前路径, 这是不允许的")
-        if not self.is_path_exists(path):  # 如果该路径不存在.
-            raise PathNotExists(f"路径'{path}'不存在")
+        if self.__is_path_contained(self._current_dir_path, self.__to_absolute_path(path)):  # 如果当前路径包含该路径.
+            raise InvalidCurrentDirOperation(f"在删除操作中, 当前路径包含待删除路径'{path}', 这是不允许的")
+        stack, path_absolute = self.__resolve_or_raise(path)  # 如果该路径不存在, 抛出异常.
         # 删除指定结点.
-        self.__goto_dir(path[:-1])
-        self.__update_parent_last_modified_time_recursively([path[-1]])  # 对指定路径向上递归更新最后修改时间
-        self._current_dir[NoteIndex.CONTENT.value].pop(path[-1])
-        self.__backward()
+        current_time = self.__now()  # 获取格式化的当前时间.
+        self.__stamp_notes(stack[:-1], current_time)  # 对指定路径向上递归更新最后修改时间
+        stack[-2].content.pop(path_absolute[-1])
+        self._tree_version += 1  # 使路径解析缓存失效.
+        self._dirty = True
+        self.__log(['d', current_time, list(path_absolute)])
 
     def mkdir(self, path: list) -> None:
         """创建一个目录 (覆盖式的) .
@@ -713,27 +999,30 @@ class DirTreeHandler:
             path: 指定创建结点的路径.
 
         Raises:
-            InvalidCurrentDirOperation: 如果该路径对应当前路径.
+            InvalidCurrentDirOperation: 如果该路径对应当前路径, 或当前路径包含该路径.
             InvalidNamingConventionError: 如果待创建结点的名称中包含“/”.
             DirOfPathNotExists: 如果该路径所在的目录是不存在的.
         """
         self.__create_note(path)
 
-    def create_file(self, path: list) -> None:
+    def create_file(self, path: list, hash_value: str = None) -> None:
         """创建一个文件 (覆盖式的) .
 
         Notes:
             * 这里的异常处理实际上是self._create_note的.
+            * 创建结点会使路径解析缓存失效, 所以创建之后再调用 `set_file_hash` 需要从头解析一遍路径,
+              创建时就给出散列值则不需要.
 
         Args:
             path: 指定创建结点的路径.
+            hash_value: 如果不为 None, 同时设置该文件的散列值 (和创建之后再调用 `set_file_hash` 的结果相同) .
 
         Raises:
-            InvalidCurrentDirOperation: 如果该路径对应当前路径.
+            InvalidCurrentDirOperation: 如果该路径对应当前路径, 或当前路径包含该路径.
             InvalidNamingConventionError: 如果待创建结点的名称中包含“/”.
             DirOfPathNotExists: 如果该路径所在的目录是不存在的.
         """
-        self.__create_note(path, NoteType.IS_FILE)
+        self.__create_note(path, NoteType.IS_FILE, hash_value)
 
     def is_dir(self, path: list) -> bool:
         """判断指定路径对应的是否是目录.
@@ -744,11 +1033,7 @@ class DirTreeHandler:
         Raises:
             PathNotExists: 如果该路径不存在.
         """
-        result = self.__goto_path(path)
-        self.__backward()
-        if not result:
+        resolved = self.__resolve(path)
+        if resolved is None:
             raise PathNotExists(f"路径'{path}'不存在")
-        if result == NoteType.IS_DIR:
-            return True
-        else:
-            return False
+        return resolved[0].is_dir
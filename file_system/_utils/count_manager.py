@@ -3,6 +3,8 @@
 # 标准库模块
 import sqlite3
 import os
+import stat
+from collections import Counter
 # 第三方库模块 (无) 
 # 自定义模块
 from ..errors import CounterExists, CounterNotExists
@@ -11,6 +13,34 @@ from ..errors import CounterExists, CounterNotExists
 TABLE_NAME = "id_count"  # 设置表名.
 ID_ATTRIBUTE = "id"  # 设置标识属性名.
 COUNT_ATTRIBUTE = "count"  # 设置计数属性名.
+COUNT_CACHE_SIZE = 4096  # 查询计数的缓存的容量 (为0时不使用缓存) .
+SELECT_BATCH_SIZE = 500  # 批量查询计数时每条语句中的标识的个数上限 (SQLite 3.32 之前每条语句最多有 999 个参数) .
+
+# 调优时使用的 PRAGMA (见 `CountManager.__init__` 的 `tune` 参数) .
+TUNING_PRAGMAS = (
+    "pragma journal_mode = WAL",  # 预写日志: 提交时只需追加写入日志, 并且读不阻塞写.
+    "pragma synchronous = NORMAL",  # 在 WAL 模式下这仍然是崩溃安全的, 只是断电时可能丢失最后一次提交.
+    "pragma temp_store = MEMORY",  # 临时表和索引放在内存中.
+    "pragma cache_size = -8192",  # 页缓存的大小为 8 MiB.
+)
+
+# 由上面的设置生成的SQL语句 (只在导入时格式化一次, 每次执行的都是同一个字符串, 这样可以命中 sqlite3 的预编译语句缓存) .
+_SQL_CREATE_TABLE = (f'create table if not exists {TABLE_NAME} ('
+                     f'{ID_ATTRIBUTE} text primary key, '
+                     f'{COUNT_ATTRIBUTE} integer)')
+_SQL_INSERT = f'insert into {TABLE_NAME} ({ID_ATTRIBUTE}, {COUNT_ATTRIBUTE}) values (?, ?)'
+_SQL_UPSERT_INCREMENT = (f'insert into {TABLE_NAME} ({ID_ATTRIBUTE}, {COUNT_ATTRIBUTE}) values (?, 1) '
+                         f'on conflict ({ID_ATTRIBUTE}) do update set {COUNT_ATTRIBUTE} = {COUNT_ATTRIBUTE} + 1')
+_SQL_UPSERT_INCREMENT_BY = (f'insert into {TABLE_NAME} ({ID_ATTRIBUTE}, {COUNT_ATTRIBUTE}) values (?, ?) '
+                            f'on conflict ({ID_ATTRIBUTE}) do update set '
+                            f'{COUNT_ATTRIBUTE} = {COUNT_ATTRIBUTE} + excluded.{COUNT_ATTRIBUTE}')
+_SQL_DECREMENT = f'update {TABLE_NAME} set {COUNT_ATTRIBUTE} = {COUNT_ATTRIBUTE} - 1 where {ID_ATTRIBUTE} = ?'
+_SQL_DECREMENT_BY = f'update {TABLE_NAME} set {COUNT_ATTRIBUTE} = {COUNT_ATTRIBUTE} - ? where {ID_ATTRIBUTE} = ?'
+_SQL_DELETE_LAST = f'delete from {TABLE_NAME} where {ID_ATTRIBUTE} = ? and {COUNT_ATTRIBUTE} = 1'
+_SQL_DELETE = f'delete from {TABLE_NAME} where {ID_ATTRIBUTE} = ?'
+_SQL_SELECT_COUNT = f'select {COUNT_ATTRIBUTE} from {TABLE_NAME} where {ID_ATTRIBUTE} = ?'
+_SQL_SELECT_COUNTS = (f'select {ID_ATTRIBUTE}, {COUNT_ATTRIBUTE} from {TABLE_NAME} '
+                      f'where {ID_ATTRIBUTE} in ({", ".join("?" * SELECT_BATCH_SIZE)})')
 
 
 class CountManager:
@@ -66,10 +96,14 @@ class CountManager:
             - **不支持** 并行.
         - 当一个标识的计数减为0时, 这个标识会被删除, 这意味着再次使用这个标识时需要创建它.
         - 当增加一个标识的计数时, 如果这个标识不存在, 会自动创建这个标识.
+        - 所有的修改都在同一个事务中 (`sqlite3` 在第一次修改前会自动开始事务) , 直到 `store_change` (或退出 `with`) 时才提交,
+          所以多次修改只有一次提交的开销. 这也意味着在此之前中断的话, 这些修改都不会保存.
         - 使用的 SQLite 的版本为 3.31.1.
     """
+    __slots__ = ('conn', 'cursor', '_count_cache')
+
     # 内部
-    def __init__(self, sqlite_dir: str, sqlite_file_name: str = "file_quote_count.sqlite"):
+    def __init__(self, sqlite_dir: str, sqlite_file_name: str = "file_quote_count.sqlite", tune: bool = True):
         """指定SQLite文件存放的目录, 执行初始化操作.
 
         Warnings:
@@ -78,29 +112,33 @@ class CountManager:
         Notes:
             * 如果相应的SQLite文件不存在, 则会创建它.
             * 如果数据库中相应的表不存在, 则会创建它.
+            * 调优时, 数据库会切换到 WAL 模式 (这是记录在数据库文件中的) , 使用期间同一目录中会有 `-wal` 和 `-shm` 两个辅助文件,
+              正常关闭后它们会被合并并删除.
 
         Args:
             sqlite_dir: SQLite文件存放的目录.
             sqlite_file_name: 设置用于存放引用计数的sqlite数据库的名字.
+            tune: 是否使用 `TUNING_PRAGMAS` 对数据库进行调优.
         Raises:
             FileNotFoundError: 如果该路径不存在.
             NotADirectoryError: 如果该路径存在但不对应一个目录.
         """
-        # 条件检查.
-        if not os.path.exists(sqlite_dir):
-            raise FileNotFoundError(f"路径'{sqlite_dir}'不存在")
-        if not os.path.isdir(sqlite_dir):
+        # 条件检查 (只调用一次 `os.stat`) .
+        try:
+            dir_stat = os.stat(sqlite_dir)
+        except (OSError, ValueError):  # 与 `os.path.exists` 一致, 不能访问的路径也视为不存在.
+            raise FileNotFoundError(f"路径'{sqlite_dir}'不存在") from None
+        if not stat.S_ISDIR(dir_stat.st_mode):
             raise NotADirectoryError(f"路径'{sqlite_dir}'存在但不对应一个目录")
         # 连接到 SQLite 数据库 (如果数据库不存在, 则会自动创建) 
         self.conn = sqlite3.connect(os.path.join(sqlite_dir, sqlite_file_name))
         self.cursor = self.conn.cursor()
+        self._count_cache = {}  # 查询过的计数的缓存: 标识 -> 计数 (修改时同步更新, 满了时淘汰最早加入的) .
+        if tune:
+            for pragma in TUNING_PRAGMAS:
+                self.cursor.execute(pragma)
         # 如果不存在该表, 则创建它.
-        self.cursor.execute(f'''
-                            create table if not exists {TABLE_NAME} (
-                                {ID_ATTRIBUTE} text primary key,
-                                {COUNT_ATTRIBUTE} integer
-                            )
-                            ''')
+        self.cursor.execute(_SQL_CREATE_TABLE)
 
     def __enter__(self):
         return self
@@ -126,9 +164,7 @@ class CountManager:
             CounterExists: 如果重复创建一个标识.
         """
         try:
-            self.cursor.execute(f'insert into {TABLE_NAME} '
-                                f'({ID_ATTRIBUTE}, {COUNT_ATTRIBUTE}) '
-                                f'values (?, ?)', (counter_id, 1))
+            self.cursor.execute(_SQL_INSERT, (counter_id, 1))
         except sqlite3.Error as exc:
             raise CounterExists(f"不能重复创建标识'{counter_id}'") from exc
 
@@ -141,11 +177,28 @@ class CountManager:
         Raises:
             可能有 sqlite 的异常.
         """
-        self.cursor.execute(f'update {TABLE_NAME} '
-                            f'set {COUNT_ATTRIBUTE} = {COUNT_ATTRIBUTE} + 1 '
-                            f'where {ID_ATTRIBUTE} = ?', (counter_id,))
-        if not self.cursor.rowcount:  # 如果没有受影响的行, 说明这个标识不存在.
-            self.create_quote_count_for_id(counter_id)
+        # 不存在则创建 (计数为1) , 存在则计数加1, 只需执行一条语句 (UPSERT 需要 SQLite 3.24 及以上的版本) .
+        self.cursor.execute(_SQL_UPSERT_INCREMENT, (counter_id,))
+        if counter_id in self._count_cache:
+            self._count_cache[counter_id] += 1
+
+    def add_quote_count_for_ids(self, counter_ids: list) -> None:
+        """对多个标识分别增加计数 (同一个标识出现几次就增加几次) .
+
+        Notes:
+            * 先合并相同的标识, 再通过一次 `executemany` 执行 (每个标识一条语句) , 和依次调用 `add_quote_count_for_id` 的结果相同.
+
+        Args:
+            counter_ids: 指定的各个标识.
+
+        Raises:
+            可能有 sqlite 的异常.
+        """
+        increments = Counter(counter_ids)
+        self.cursor.executemany(_SQL_UPSERT_INCREMENT_BY, increments.items())
+        if self._count_cache:  # 直接丢弃这些标识的缓存.
+            for counter_id in increments:
+                self._count_cache.pop(counter_id, None)
 
     def sub_quote_count_for_id(self, counter_id: str) -> bool:
         """减少指定标识的计数 (当计数为0时, 会删除这个标识) .
@@ -162,19 +215,74 @@ class CountManager:
         Raises:
             CounterNotExists: 如果对一个不存在的标识减少计数.
         """
-        try:
-            self.cursor.execute(f'update {TABLE_NAME} '
-                                f'set {COUNT_ATTRIBUTE} = {COUNT_ATTRIBUTE} - 1 '
-                                f'where {ID_ATTRIBUTE} = ?', (counter_id,))
-            self.cursor.execute(f'delete from {TABLE_NAME} '
-                                f'where {ID_ATTRIBUTE} = ? and {COUNT_ATTRIBUTE} = 0',
-                                (counter_id,))
-            if self.cursor.rowcount:  # 如果有受影响的行, 说明这个标识被删除了.
-                return True
+        # 如果这是最后一次引用, 直接删除这个标识 (这样计数减为0时只需执行一条语句) .
+        self.cursor.execute(_SQL_DELETE_LAST, (counter_id,))
+        if self.cursor.rowcount:  # 如果有受影响的行, 说明这个标识被删除了.
+            self._count_cache.pop(counter_id, None)
+            return True
+        self.cursor.execute(_SQL_DECREMENT, (counter_id,))
+        if not self.cursor.rowcount:  # 如果没有受影响的行, 说明这个标识不存在.
+            raise CounterNotExists(f"不能减少一个不存在的标识'{counter_id}'的计数")
+        if counter_id in self._count_cache:
+            self._count_cache[counter_id] -= 1
+        return False
+
+    def sub_quote_count_for_ids(self, counter_ids: list) -> list:
+        """对多个标识分别减少计数 (同一个标识出现几次就减少几次, 当计数为0时, 会删除这个标识) .
+
+        Notes:
+            * 先 (分批地) 查询这些标识的计数, 再通过两次 `executemany` 分别删除和减少, 而不是对每个标识执行一两条语句.
+            * 如果会出错, 在做任何修改之前就抛出异常.
+
+        Args:
+            counter_ids: 指定的各个标识.
+
+        Returns:
+            因此被删除了的标识的列表.
+
+        Raises:
+            CounterNotExists: 如果对一个不存在的标识减少计数 (包括减少的次数超过了它的计数) .
+        """
+        decrements = Counter(counter_ids)
+        # 查询各个标识的计数 (每条语句的参数个数是固定的, 不足的用 None 补齐, 这样执行的总是同一个语句) .
+        distinct_ids = list(decrements)
+        counts = {}
+        for start in range(0, len(distinct_ids), SELECT_BATCH_SIZE):
+            batch = distinct_ids[start:start + SELECT_BATCH_SIZE]
+            batch += [None] * (SELECT_BATCH_SIZE - len(batch))
+            counts.update(self.cursor.execute(_SQL_SELECT_COUNTS, batch))
+        # 检查, 并分出要删除的和要减少计数的.
+        deleted_ids, remaining = [], []
+        for counter_id, decrement in decrements.items():
+            count = counts.get(counter_id)
+            if count is None or count < decrement:
+                raise CounterNotExists(f"不能减少一个不存在的标识'{counter_id}'的计数")
+            if count == decrement:
+                deleted_ids.append(counter_id)
             else:
-                return False
-        except sqlite3.Error as exc:
-            raise CounterNotExists(f"不能减少一个不存在的标识'{counter_id}'的计数") from exc
+                remaining.append((decrement, counter_id))
+        # 执行修改, 并同步更新缓存.
+        self.cursor.executemany(_SQL_DELETE, ((counter_id,) for counter_id in deleted_ids))
+        self.cursor.executemany(_SQL_DECREMENT_BY, remaining)
+        count_cache = self._count_cache
+        if count_cache:
+            for counter_id in deleted_ids:
+                count_cache.pop(counter_id, None)
+            for decrement, counter_id in remaining:
+                if counter_id in count_cache:
+                    count_cache[counter_id] -= decrement
+        return deleted_ids
+
+    def is_id_exists(self, counter_id: str) -> bool:
+        """查询指定标识是否存在 (即计数不为0) .
+
+        Notes:
+            * 在缓存中的标识一定存在, 不用再查询数据库.
+        """
+        if counter_id in self._count_cache:
+            return True
+        self.cursor.execute(_SQL_SELECT_COUNT, (counter_id,))
+        return self.cursor.fetchone() is not None
 
     def get_quote_count_for_id(self, counter_id: str) -> int:
         """查询指定标识的计数.
@@ -182,13 +290,22 @@ class CountManager:
         Args:
             counter_id:
 
+        Notes:
+            * 查询的结果会被缓存 (见 `COUNT_CACHE_SIZE`) , 缓存随着各个修改方法同步更新.
+
         Raises:
             CounterNotExists: 如果这个标识不存在.
         """
-        self.cursor.execute(f"select {COUNT_ATTRIBUTE} "
-                            f"from {TABLE_NAME} "
-                            f"where {ID_ATTRIBUTE} = ?", (counter_id,))
+        count_cache = self._count_cache
+        count = count_cache.get(counter_id)
+        if count is not None:
+            return count
+        self.cursor.execute(_SQL_SELECT_COUNT, (counter_id,))
         row = self.cursor.fetchone()
         if not row:
             raise CounterNotExists(f"不能查询一个不存在的标识'{counter_id}'的计数")
+        if COUNT_CACHE_SIZE:
+            if len(count_cache) >= COUNT_CACHE_SIZE:
+                del count_cache[next(iter(count_cache))]
+            count_cache[counter_id] = row[0]
         return row[0]
@@ -0,0 +1,191 @@
+"""尽量在内核中完成的文件复制."""
+
+# 标准库模块
+import os
+import sys
+import stat
+import errno
+import shutil
+try:
+    import fcntl
+except ImportError:  # Windows 上没有.
+    fcntl = None
+from concurrent.futures import ThreadPoolExecutor
+
+# 第三方库模块 (无)
+
+# 自定义模块 (无)
+
+# 用于设置的全局变量.
+COPY_CHUNK_SIZE = 1024 * 1024  # 每次让内核复制的最大字节数, 以及最后退回到读写时的缓冲区大小.
+
+# `os.copy_file_range` 和 `os.sendfile` 不是所有平台都有 (没有时退回到读写) .
+_copy_file_range = getattr(os, 'copy_file_range', None)
+_sendfile = getattr(os, 'sendfile', None)
+# 通过已经打开的文件描述符设置权限位, 不是所有平台都有 (没有时退回到 `shutil.copymode`) .
+_fchmod = getattr(os, 'fchmod', None)
+# 提示内核将按顺序读取源文件 (以便预读) , 复制完之后不再需要它的页缓存, 只有 Unix 上有.
+_posix_fadvise = getattr(os, 'posix_fadvise', None)
+# Linux 上让目标文件直接共享源文件的数据块 (reflink, 只有 Btrfs, XFS 等支持) 的 `ioctl` 请求号,
+# `fcntl.FICLONE` 从 Python 3.12 才有, 之前的版本使用它在 Linux 上的值.
+_FICLONE = getattr(fcntl, 'FICLONE', 0x40049409 if sys.platform.startswith('linux') else None) if fcntl else None
+# 这些错误说明当前的文件 (系统) 不支持相应的系统调用, 此时换用下一种方法.
+_UNSUPPORTED_ERRNOS = frozenset(
+    code for code in (
+        getattr(errno, name, None)
+        for name in ('ENOSYS', 'EXDEV', 'EINVAL', 'EOPNOTSUPP', 'ENOTSUP', 'ENOTSOCK', 'EBADF')
+    ) if code is not None
+)
+
+
+class FileCopier:
+    """复制一个文件, 尽量不经过用户空间的缓冲区.
+
+    ## 使用示例
+
+    ```python
+    FileCopier.copy_file("a.txt", "b.txt")
+    # 并行地复制多个文件
+    FileCopier.copy_many([("a.txt", "c.txt"), ("b.txt", "d.txt")])
+    ```
+
+    Notes:
+        - 依次尝试 `ioctl(FICLONE)` (reflink, 不论文件多大都只修改元数据) , `os.copy_file_range` (在同一个文件系统中可能直接共享数据块, 比如 Btrfs, XFS 的 reflink) ,
+          `os.sendfile` 和普通的读写, 前一种方法不被支持时换用后一种.
+        - 和 `shutil.copy` 一样, 也复制权限位 (通过已经打开的两个文件的描述符, 不再按路径查询和修改) .
+        - 源文件只被读取一遍, 所以复制前提示内核按顺序预读, 复制后提示内核可以丢弃它的页缓存
+          (复制一个很大的目录时, 不会因为这些只读一遍的文件挤掉别的页缓存) .
+    """
+    @classmethod
+    def copy_file(cls, src_file_path: str, dst_file_path: str, exclusive: bool = False) -> None:
+        """复制文件的内容和权限位.
+
+        Notes:
+            * 如果复制的过程中出错, 会删除已经写入了一部分的目标文件.
+
+        Args:
+            src_file_path: 源文件的路径.
+            dst_file_path: 目标文件的路径.
+            exclusive: 为 False 时, 目标文件存在时会被覆盖; 为 True 时, 目标文件存在时抛出异常.
+
+        Raises:
+            FileExistsError: 如果 exclusive 为 True 并且目标文件存在.
+            其他由文件操作引发的异常也可能发生.
+        """
+        dst_mode = 'xb' if exclusive else 'wb'
+        with open(src_file_path, 'rb', buffering=0) as src, open(dst_file_path, dst_mode, buffering=0) as dst:
+            try:
+                src_fd, dst_fd = src.fileno(), dst.fileno()
+                if _posix_fadvise is not None:
+                    _posix_fadvise(src_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                if not cls.__clone_via_ioctl(src_fd, dst_fd) \
+                        and not cls.__copy_via(_copy_file_range, src_fd, dst_fd) \
+                        and not cls.__copy_via(_sendfile, src_fd, dst_fd):
+                    cls.__copy_via_read_write(src, dst)
+                if _fchmod is not None:
+                    _fchmod(dst_fd, stat.S_IMODE(os.fstat(src_fd).st_mode))
+                if _posix_fadvise is not None:
+                    _posix_fadvise(src_fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            except BaseException:
+                dst.close()
+                os.remove(dst_file_path)
+                raise
+        if _fchmod is None:
+            shutil.copymode(src_file_path, dst_file_path)
+
+    @classmethod
+    def copy_many(cls, src_dst_pairs: list, max_workers: int = None, exclusive: bool = False) -> None:
+        """并行地复制多个文件.
+
+        Notes:
+            * 复制文件的系统调用都会释放GIL, 所以使用线程池就可以让多个文件的复制并行 (在 SSD 或网络文件系统上可以隐藏延迟) .
+            * 文件数不超过一个时直接复制, 不创建线程池.
+
+        Args:
+            src_dst_pairs: 各个 (源文件的路径, 目标文件的路径) .
+            max_workers: 线程池的最大线程数, 默认由 `ThreadPoolExecutor` 决定.
+            exclusive: 同 `copy_file`.
+
+        Raises:
+            同 `copy_file` (如果有多个文件出错, 抛出的是其中最靠前的文件的异常) .
+        """
+        if len(src_dst_pairs) <= 1:
+            for src_file_path, dst_file_path in src_dst_pairs:
+                cls.copy_file(src_file_path, dst_file_path, exclusive)
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lambda pair: cls.copy_file(*pair, exclusive), src_dst_pairs))
+
+    @staticmethod
+    def __clone_via_ioctl(src_fd: int, dst_fd: int) -> bool:
+        """使用 `ioctl(FICLONE)` 让目标文件共享源文件的全部数据块.
+
+        Args:
+            src_fd: 源文件的文件描述符.
+            dst_fd: 目标文件的文件描述符.
+
+        Returns:
+            是否已经复制完成. 如果不被支持 (比如不在同一个文件系统中, 或者文件系统不支持 reflink) , 返回 False.
+
+        Raises:
+            其他由文件操作引发的异常也可能发生.
+        """
+        if _FICLONE is None:
+            return False
+        try:
+            fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        except OSError as e:
+            if e.errno in _UNSUPPORTED_ERRNOS or e.errno == errno.ENOTTY:
+                return False
+            raise
+        return True
+
+    @staticmethod
+    def __copy_via_read_write(src, dst) -> None:
+        """通过普通的读写从当前位置复制到文件末尾 (复用同一个缓冲区) .
+
+        Notes:
+            * 两个文件都是无缓冲的, 写入可能只写入一部分, 所以每一块都要写到全部写入为止
+              (`shutil.copyfileobj` 不检查 `write` 的返回值, 会使目标文件缺少一部分内容) .
+
+        Raises:
+            其他由文件操作引发的异常也可能发生.
+        """
+        buffer = bytearray(COPY_CHUNK_SIZE)
+        view = memoryview(buffer)
+        while size := src.readinto(buffer):
+            chunk = view[:size]
+            while chunk:  # 无缓冲的写入可能只写入一部分.
+                chunk = chunk[dst.write(chunk):]
+
+    @staticmethod
+    def __copy_via(copy_func, src_fd: int, dst_fd: int) -> bool:
+        """使用 `os.copy_file_range` 或 `os.sendfile` 从当前位置复制到文件末尾.
+
+        Args:
+            copy_func: `os.copy_file_range` 或 `os.sendfile` (为 None 时表示没有) .
+            src_fd: 源文件的文件描述符.
+            dst_fd: 目标文件的文件描述符.
+
+        Returns:
+            是否已经复制完成. 如果还没有复制任何内容就发现不被支持 (或者已经到了末尾) , 返回 False, 这时可以换用别的方法.
+
+        Raises:
+            其他由文件操作引发的异常也可能发生.
+        """
+        if copy_func is None:
+            return False
+        copied = 0
+        while True:
+            try:
+                if copy_func is _sendfile:
+                    size = copy_func(dst_fd, src_fd, None, COPY_CHUNK_SIZE)
+                else:
+                    size = copy_func(src_fd, dst_fd, COPY_CHUNK_SIZE)
+            except OSError as e:
+                if copied == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                    return False
+                raise
+            if size == 0:  # 到了文件末尾 (一开始就到了末尾时换用别的方法再试, 因为有的特殊文件报告的大小是 0) .
+                return copied > 0
+            copied += size
@@ -2,12 +2,29 @@
 
 # 标准库模块
 import os
+import stat
+import mmap
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 # 第三方库模块 (无)
 
 # 自定义模块 (无)
 
+# 用于设置的全局变量.
+HASH_ALGORITHM = 'sha256'  # 默认的散列算法 (散列值被用作 file_id, 见类的文档字符串, 不要随意修改) .
+SMALL_FILE_SIZE = 256 * 1024  # 小于这个大小的文件一次读入, 不小于的则通过内存映射计算.
+
+# `hashlib.file_digest` 在 Python 3.11 及以上的版本中才有 (没有时退回到逐块读取并更新) .
+_file_digest = getattr(hashlib, 'file_digest', None)
+# 提示内核将按顺序访问映射的内存 (以便预读) 并且马上就会访问 (以便立即开始读入) , 不是所有平台都有.
+_MADVICES = tuple(
+    advice for advice in (getattr(mmap, name, None) for name in ('MADV_SEQUENTIAL', 'MADV_WILLNEED'))
+    if advice is not None
+)
+# 提示内核将按顺序读取文件 (以便预读) , 只有 Unix 上有.
+_posix_fadvise = getattr(os, 'posix_fadvise', None)
+
 
 class FileHashCalculator:
     """使用sha256算法对一个文件生成哈希值.
@@ -19,12 +36,26 @@ class FileHashCalculator:
     file_path = "test.txt"
     hash_value = FileHashCalculator.calculate_file_hash(file_path)
     print(hash_value)
+    # 并行地计算多个文件的哈希值
+    hash_values = FileHashCalculator.calculate_many(["a.txt", "b.txt"])
+    print(hash_values)
+    # 复制文件的同时计算它的哈希值
+    hash_value = FileHashCalculator.copy_and_calculate_file_hash("test.txt", "test_copy.txt")
+    print(hash_value)
+    ```
+
+    Notes:
+        - 默认使用 sha256: `hashlib` 的 sha256 由 OpenSSL 实现, 在支持 SHA 扩展指令 (SHA-NI, ARMv8 的 SHA2 指令) 的 CPU 上
+          会自动使用这些指令, 这时它是标准库中最快的 (比 blake2b 还快) , 所以不需要第三方的散列库.
+        - 散列值被用作 file_id (即实体文件的文件名) , 更换算法会使已有的实体文件不能和新加入的相同文件去重.
+          所以也 **不** 根据是否安装了第三方库 (比如 `blake3`) 自动选择算法: 同一个文件系统在不同的环境中会得到不同的 file_id.
+          默认的算法只在 `HASH_ALGORITHM` 一处设置.
     """
     @classmethod
     def calculate_file_hash(
         cls,
         file_path: str,
-        hash_algorithm: str = 'sha256',
+        hash_algorithm: str = HASH_ALGORITHM,
         chunk_size: int = 65536
     ) -> str:
         """使用指定算法计算文件的hash值.
@@ -32,7 +63,7 @@ class FileHashCalculator:
         Args:
             file_path: 指定文件的路径.
             hash_algorithm: 指定计算hash的算法.
-            chunk_size: 每次读取的块大小，默认 64KB.
+            chunk_size: 每次读取的块大小，默认 64KB (只在不能内存映射并且没有 `hashlib.file_digest` 时使用) .
 
         Returns:
             指定文件对应指定算法的哈希值的十六进制字符串表示.
@@ -41,16 +72,141 @@ class FileHashCalculator:
             FileNotFoundError: 如果该路径不存在；
             IsADirectoryError: 如果该路径存在但不对应一个文件；
         """
-        # 条件检查；
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"路径'{file_path}'不存在")
-        if not os.path.isfile(file_path):
+        # 条件检查 (只调用一次 `os.stat`, 它的结果也用于下面判断文件的大小) ；
+        try:
+            file_stat = os.stat(file_path)
+        except (OSError, ValueError):  # 与 `os.path.exists` 一致, 不能访问的路径也视为不存在；
+            raise FileNotFoundError(f"路径'{file_path}'不存在") from None
+        if not stat.S_ISREG(file_stat.st_mode):
             raise IsADirectoryError(f"路径'{file_path}'存在但不对应一个文件")
-        # 选择哈希算法；
-        hash_func = hashlib.new(hash_algorithm)
         # 对文件计算hash值；
         with open(file_path, 'rb') as f:
-            while chunk := f.read(chunk_size):
-                hash_func.update(chunk)
+            if file_stat.st_size < SMALL_FILE_SIZE:  # 小文件一次读入, 省去循环；
+                return hashlib.new(hash_algorithm, f.read()).hexdigest()
+            try:  # 大文件通过内存映射直接交给哈希函数, 省去从内核到缓冲区的复制；
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for advice in _MADVICES:
+                        mm.madvise(advice)
+                    hash_func = hashlib.new(hash_algorithm)
+                    hash_func.update(mm)
+                    return hash_func.hexdigest()
+            except (OSError, ValueError, OverflowError):  # 不能内存映射 (比如太大或者是特殊的文件) 时, 退回到读取；
+                f.seek(0)
+            if _file_digest is not None:  # 读取和更新的循环都在C中进行, 并且复用同一个缓冲区；
+                return _file_digest(f, hash_algorithm).hexdigest()
+            hash_func = hashlib.new(hash_algorithm)  # 选择哈希算法；
+            buffer = bytearray(chunk_size)  # 复用同一个缓冲区, 不为每一块分配新的 bytes 对象；
+            view = memoryview(buffer)
+            while size := f.readinto(buffer):
+                hash_func.update(view[:size])
         # 返回哈希值的十六进制表示；
         return hash_func.hexdigest()
+
+    @classmethod
+    def calculate_many(
+        cls,
+        file_paths: list,
+        hash_algorithm: str = HASH_ALGORITHM,
+        max_workers: int = None
+    ) -> list:
+        """使用指定算法并行地计算多个文件的hash值.
+
+        Notes:
+            * 读取文件和计算哈希值时都会释放GIL, 所以使用线程池就可以让多个文件的计算并行.
+            * 文件数不超过一个时直接计算, 不创建线程池.
+
+        Args:
+            file_paths: 各个文件的路径.
+            hash_algorithm: 指定计算hash的算法.
+            max_workers: 线程池的最大线程数, 默认由 `ThreadPoolExecutor` 决定.
+
+        Returns:
+            与 file_paths 一一对应的哈希值的十六进制字符串表示的列表.
+
+        Raises:
+            同 `calculate_file_hash` (如果有多个文件出错, 抛出的是其中最靠前的文件的异常) .
+        """
+        if len(file_paths) <= 1:
+            return [cls.calculate_file_hash(file_path, hash_algorithm) for file_path in file_paths]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda file_path: cls.calculate_file_hash(file_path, hash_algorithm), file_paths))
+
+    @classmethod
+    def copy_and_calculate_file_hash(
+        cls,
+        src_file_path: str,
+        dst_file_path: str,
+        hash_algorithm: str = HASH_ALGORITHM,
+        chunk_size: int = 1024 * 1024
+    ) -> str:
+        """复制文件的同时使用指定算法计算它的hash值 (源文件只读取一遍) .
+
+        Notes:
+            * 目标文件存在时会被覆盖.
+            * 如果出错, 已经写入的目标文件不会被删除, 由调用者处理.
+
+        Args:
+            src_file_path: 源文件的路径.
+            dst_file_path: 目标文件的路径.
+            hash_algorithm: 指定计算hash的算法.
+            chunk_size: 每次读取的块大小，默认 1MB.
+
+        Returns:
+            源文件对应指定算法的哈希值的十六进制字符串表示.
+
+        Raises:
+            FileNotFoundError: 如果源路径不存在；
+            IsADirectoryError: 如果源路径存在但不对应一个文件；
+            其他由文件操作引发的异常也可能发生.
+        """
+        # 条件检查；
+        try:
+            file_stat = os.stat(src_file_path)
+        except (OSError, ValueError):  # 与 `os.path.exists` 一致, 不能访问的路径也视为不存在；
+            raise FileNotFoundError(f"路径'{src_file_path}'不存在") from None
+        if not stat.S_ISREG(file_stat.st_mode):
+            raise IsADirectoryError(f"路径'{src_file_path}'存在但不对应一个文件")
+        hash_func = hashlib.new(hash_algorithm)
+        with open(src_file_path, 'rb', buffering=0) as src, open(dst_file_path, 'wb', buffering=0) as dst:
+            if not (file_stat.st_size >= SMALL_FILE_SIZE
+                    and cls.__copy_and_hash_via_mmap(src, dst, hash_func, chunk_size)):
+                # 逐块读取, 每一块都先更新哈希值再写入目标文件；
+                if _posix_fadvise is not None:
+                    _posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                buffer = bytearray(min(chunk_size, file_stat.st_size) or 1)  # 复用同一个缓冲区 (不比文件大) ；
+                view = memoryview(buffer)
+                while size := src.readinto(buffer):
+                    cls.__write_all(dst, view[:size], hash_func)
+            if _posix_fadvise is not None:  # 源文件只读取一遍, 之后不再需要它的页缓存；
+                _posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        # 返回哈希值的十六进制表示；
+        return hash_func.hexdigest()
+
+    @classmethod
+    def __copy_and_hash_via_mmap(cls, src, dst, hash_func, chunk_size: int) -> bool:
+        """通过内存映射读取源文件, 逐块更新哈希值并写入目标文件 (省去从内核到缓冲区的复制) .
+
+        Returns:
+            是否已经完成. 如果不能内存映射 (比如太大或者是特殊的文件) , 返回 False, 这时什么都还没有做, 可以换用读取.
+
+        Raises:
+            其他由文件操作引发的异常也可能发生.
+        """
+        try:
+            mm = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, OverflowError):
+            return False
+        with mm:
+            for advice in _MADVICES:
+                mm.madvise(advice)
+            with memoryview(mm) as view:  # 必须在关闭映射之前释放；
+                for offset in range(0, len(view), chunk_size):
+                    cls.__write_all(dst, view[offset:offset + chunk_size], hash_func)
+        return True
+
+    @staticmethod
+    def __write_all(dst, chunk: memoryview, hash_func) -> None:
+        """先用一块内容更新哈希值, 再把它全部写入 (无缓冲的) 目标文件."""
+        hash_func.update(chunk)
+        while chunk:  # 无缓冲的写入可能只写入一部分；
+            chunk = chunk[dst.write(chunk):]
@@ -7,9 +7,96 @@
 # 自定义模块
 from ..virtual_file_system import VirtualFileSystem
 
-# 设置命令集合
-COMMAND_SET = ('q!', 'pwd', 'cd', 'ls', 'mkdir', 'cp', 'mv', 'rm',
-               'cp_from_outside', 'cp_to_outside', 'cp_from_outside_ex', 'cp_to_outside_ex', 'diff')
+
+# 各个命令的处理函数 (输入命令需要的参数, 并调用文件系统的相应方法)
+def _pwd(vfs: VirtualFileSystem) -> None:
+    print(f"当前目录: {vfs.get_current_dir_path()}")
+
+
+def _cd(vfs: VirtualFileSystem) -> None:
+    goto_path = input("输入你要切换到的目录: ")
+    vfs.chdir(goto_path)
+    print(f'当前目录: {vfs.get_current_dir_path()}')
+
+
+def _ls(vfs: VirtualFileSystem) -> None:
+    print(f"{vfs.get_dir_content('')}")
+
+
+def _mkdir(vfs: VirtualFileSystem) -> None:
+    dir_path = input("输入你要创建的目录路径: ")
+    vfs.mkdir(dir_path)
+
+
+def _cp(vfs: VirtualFileSystem) -> None:
+    src_path = input("输入源路径: ")
+    dst_path = input("输入目标路径: ")
+    vfs.copy(src_path, dst_path)
+
+
+def _mv(vfs: VirtualFileSystem) -> None:
+    src_path = input("输入源路径: ")
+    dst_path = input("输入目标路径: ")
+    vfs.move(src_path, dst_path)
+
+
+def _rm(vfs: VirtualFileSystem) -> None:
+    rm_path = input("输入要删除的路径: ")
+    vfs.delete(rm_path)
+
+
+def _cp_from_outside(vfs: VirtualFileSystem) -> None:
+    src_path = input("输入外部路径: ")
+    dst_path = input("输入内部路径: ")
+    vfs.copy_from_outside(src_path, dst_path)
+
+
+def _cp_to_outside(vfs: VirtualFileSystem) -> None:
+    src_path = input("输入内部路径: ")
+    dst_path = input("输入外部路径: ")
+    vfs.copy_to_outside(src_path, dst_path)
+
+
+def _cp_from_outside_ex(vfs: VirtualFileSystem) -> None:
+    src_path = input("输入外部路径: ")
+    dst_path = input("输入内部路径: ")
+    type_filter = (input("输入类型列表(用 ',' 分隔): ")).split(',')
+    vfs.copy_dir_from_outside_ex(src_path, dst_path, type_filter)
+
+
+def _cp_to_outside_ex(vfs: VirtualFileSystem) -> None:
+    src_path = input("输入内部路径: ")
+    dst_path = input("输入外部路径: ")
+    type_filter = (input("输入类型列表(用 ',' 分隔): ")).split(',')
+    vfs.copy_dir_to_outside_ex(src_path, dst_path, type_filter)
+
+
+def _diff(vfs: VirtualFileSystem) -> None:
+    base_path = input("输入作为基准比对目录的内部路径: ")
+    patch_patch = input("输入作为比对目录的内部路径: ")
+    diff_results = vfs.compare_two_dir(base_path, patch_patch)
+    print(diff_results)
+
+
+# 设置命令到处理函数的映射 (查找命令是 O(1) 的)
+COMMAND_HANDLERS = {
+    'pwd': _pwd,
+    'cd': _cd,
+    'ls': _ls,
+    'mkdir': _mkdir,
+    'cp': _cp,
+    'mv': _mv,
+    'rm': _rm,
+    'cp_from_outside': _cp_from_outside,
+    'cp_to_outside': _cp_to_outside,
+    'cp_from_outside_ex': _cp_from_outside_ex,
+    'cp_to_outside_ex': _cp_to_outside_ex,
+    'diff': _diff,
+}
+
+# 设置命令集合 (仅用于显示)
+COMMAND_SET = ('q!',) + tuple(COMMAND_HANDLERS)
+
 
 def run():
     """运行简单的文件系统 *命令行* ui"""
@@ -26,54 +113,11 @@ def run():
                     print("退出啦...")
                     break
                 # 如果是无效的命令, 抛出异常
-                if command not in COMMAND_SET:
+                handler = COMMAND_HANDLERS.get(command)
+                if handler is None:
                     raise Exception(f"{command} 是一个无效的命令.\n"
                                     f"支持的命令: {COMMAND_SET}")
                 # 执行相应的命令
-                if command == 'pwd':
-                    print(f"当前目录: {vfs.get_current_dir_path()}")
-                elif command == 'cd':
-                    goto_path = input("输入你要切换到的目录: ")
-                    vfs.chdir(goto_path)
-                    print(f'当前目录: {vfs.get_current_dir_path()}')
-                elif command == 'ls':
-                    print(f"{vfs.get_dir_content('')}")
-                elif command == 'mkdir':
-                    dir_path = input("输入你要创建的目录路径: ")
-                    vfs.mkdir(dir_path)
-                elif command == 'cp':
-                    src_path = input("输入源路径: ")
-                    dst_path = input("输入目标路径: ")
-                    vfs.copy(src_path, dst_path)
-                elif command == 'mv':
-                    src_path = input("输入源路径: ")
-                    dst_path = input("输入目标路径: ")
-                    vfs.move(src_path, dst_path)
-                elif command == 'rm':
-                    rm_path = input("输入要删除的路径: ")
-                    vfs.delete(rm_path)
-                elif command == 'cp_from_outside':
-                    src_path = input("输入外部路径: ")
-                    dst_path = input("输入内部路径: ")
-                    vfs.copy_from_outside(src_path, dst_path)
-                elif command == 'cp_to_outside':
-                    src_path = input("输入内部路径: ")
-                    dst_path = input("输入外部路径: ")
-                    vfs.copy_to_outside(src_path, dst_path)
-                elif command == 'cp_from_outside_ex':
-                    src_path = input("输入外部路径: ")
-                    dst_path = input("输入内部路径: ")
-                    type_filter = (input("输入类型列表(用 ',' 分隔): ")).split(',')
-                    vfs.copy_dir_from_outside_ex(src_path, dst_path, type_filter)
-                elif command == 'cp_to_outside_ex':
-                    src_path = input("输入内部路径: ")
-                    dst_path = input("输入外部路径: ")
-                    type_filter = (input("输入类型列表(用 ',' 分隔): ")).split(',')
-                    vfs.copy_dir_to_outside_ex(src_path, dst_path, type_filter)
-                elif command == 'diff':
-                    base_path = input("输入作为基准比对目录的内部路径: ")
-                    patch_patch = input("输入作为比对目录的内部路径: ")
-                    diff_results = vfs.compare_two_dir(base_path, patch_patch)
-                    print(diff_results)
+                handler(vfs)
             except Exception as e:
                 print(f"Oops! 粗错啦: {e}")
@@ -6,8 +6,18 @@
 
 # 标准库模块
 from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from functools import lru_cache
 import os
+import re
+import sys
+import mmap
+import stat
+import errno
 import shutil
+import uuid
+import time
 
 # 第三方库模块 (无)
 
@@ -15,6 +25,7 @@ import shutil
 from ._dir_tree_handler import DirTreeHandler
 from ._utils.count_manager import CountManager
 from ._utils.file_hash import FileHashCalculator
+from ._utils.file_copy import FileCopier
 from .errors import (
     InvalidPath,
     PathNotExists,
@@ -23,13 +34,25 @@ from .errors import (
     InvalidOperation,
     InvalidCurrentDirOperation,
     DirOfPathNotExists,
-    PathExists
+    PathExists,
+    FileIDNotFound
 )
 
 # 用于设置的全局变量
 ENTITY_FILES_DIR_NAME = "EntityFiles"  # 设置存放实体文件的目录名.
 USERS_DIR_NAME = "Users"  # 设置用户空间的目录名.
 USER_JSON_FILE_NAME = "dirTreeHandler.json"  # 设置用于构建目录树的json文件 (就是所谓的'特殊文件') 的名字.
+INGEST_TMP_FILE_PREFIX = ".ingest."  # 设置导入外部文件时在实体文件集目录中使用的临时文件的名字的前缀.
+ENTITY_SHARD_LENGTH = 2  # 设置实体文件按散列值的前几个字符分到实体文件集目录的子目录中 (子目录名就是这几个字符) .
+INNER_PATH_CACHE_SIZE = 4096  # 设置'内部路径'到'列表路径'的转换结果的缓存的容量.
+OUTER_FILE_ID_CACHE_SIZE = 65536  # 设置按状态缓存的外部文件的散列值的个数上限 (为0时不使用缓存, 见 `__get_cached_outer_file_id`) .
+# 设置外部文件的状态改变时间距离查询它的状态时不到多久 (纳秒) 时不缓存它的散列值 (这时之后的修改可能不会改变它的状态) .
+OUTER_FILE_RACY_INTERVAL_NS = 1_000_000_000
+# 设置非法的'内部路径'的规则 (一个正则表达式, 路径中只要有一处匹配就是非法的) , 现在只是不允许有相邻的 '/'.
+# 要增加规则时, 用 '|' 把它们合并到这一个表达式中 (比如 r'//|[*?"<>|]') , 这样检查一个路径仍然只需扫描一遍.
+INVALID_INNER_PATH_PATTERN = r'//'
+
+_INVALID_INNER_PATH_RE = re.compile(INVALID_INNER_PATH_PATTERN)  # 只在导入时编译一次.
 
 
 # 主类
@@ -122,22 +145,31 @@ class VirtualFileSystem:
         """
         self._root_dir = root_dir
         self._entity_files_dir = os.path.join(root_dir, ENTITY_FILES_DIR_NAME)
+        # 实体文件的路径都以这个前缀开头 (只连接一次, 之后对每个实体文件只需连接字符串, 不用再调用 `os.path.join`) .
+        self._entity_file_path_prefix = os.path.join(self._entity_files_dir, '')
         self._user_id = user_id
         self._user_path = os.path.join(root_dir, USERS_DIR_NAME, user_id)
-        # 如果没有则创建'根目录'、'实体文件集目录'、'用户空间目录'、'用户目录'
-        if not os.path.exists(root_dir):
-            os.mkdir(root_dir)
-        if not os.path.exists(self._entity_files_dir):
-            os.mkdir(self._entity_files_dir)
-        users_dir = os.path.join(root_dir, USERS_DIR_NAME)
-        if not os.path.exists(users_dir):
-            os.mkdir(users_dir)
-        if not os.path.exists(self._user_path):
-            os.mkdir(self._user_path)
+        # 如果没有则创建'实体文件集目录'、'用户目录' (以及它们的上层目录'根目录'、'用户空间目录') .
+        # 通常它们都已经存在, 这时每个目录只有一次 (失败的) `os.mkdir`, 而不是先查询再创建.
+        for dir_path in (self._entity_files_dir, self._user_path):
+            try:
+                os.mkdir(dir_path)
+            except FileExistsError:
+                pass
+            except FileNotFoundError:  # 如果上层目录也不存在.
+                os.makedirs(dir_path, exist_ok=True)
+        self._entity_shard_dirs = set()  # 已经确认存在的实体文件集目录的子目录.
+        # 引用计数已经减为 0 的实体文件的file_id, 保存时 (提交了引用计数之后) 才删除它们 (见 `store_change`) .
+        self._entity_files_to_remove = set()
+        self.__shard_flat_entity_files()
+        # 根目录的真实路径 (只计算一次, 用于检查外部路径是否包含根目录) .
+        self._root_real_path = os.path.normcase(os.path.realpath(root_dir))
         self._dir_tree_handler = DirTreeHandler(os.path.join(self._user_path, USER_JSON_FILE_NAME),
                                                 json_indent_zero=json_indent_zero,
                                                 json_sep_close=json_sep_close)
         self._file_quote_count_manager = CountManager(root_dir)
+        # 外部文件的状态 (见 `__get_outer_file_key`) -> 散列值, 按最近使用的顺序排列.
+        self._outer_file_id_cache = OrderedDict()
 
     def __enter__(self):
         return self
@@ -147,7 +179,7 @@ class VirtualFileSystem:
 
         Notes:
             * 这里有一个很有意思的地方, 即使忘了保存, 也没什么用户集看到的引用计数和实际的引用计数不一致的问题。
-              唯一的问题似乎只是, 引用计数不为0的文件可能已经被删除了, 引用计数为0的文件可能还在 (我们看到这是非常开心的！) .
+              唯一的问题似乎只是, 引用计数为0的文件可能还在 (我们看到这是非常开心的！) .
         """
         self.store_change()
 
@@ -157,38 +189,51 @@ class VirtualFileSystem:
 
         Notes:
             * 这里简单设置成不允许有相邻的 ‘/’ (这样就不至于有中间结点为 '', 即空字符串) .
+            * 所有的规则都在 `INVALID_INNER_PATH_PATTERN` 中, 它被预先编译成一个正则表达式.
 
         Raises:
             InvalidPath: 如果路径是非法的.
         """
-        is_valid = True
-
         # 规范检查.
-        if "//" in path:
-            is_valid = False
-
-        if not is_valid:
+        if _INVALID_INNER_PATH_RE.search(path):
             raise InvalidPath(f"路径'{path}'是非法的")
 
     @staticmethod
     def __convert_inner_path_to_list_path(path: str) -> list:
         """'内部路径'转换成'列表路径'.
 
+        Notes:
+            * 转换的结果是缓存的 (见 `__convert_inner_path_to_tuple_path`) , 这里返回的是它的一个新的列表, 调用者可以随意修改.
+              只读取路径的方法 (比如查询) 直接使用缓存的元组, 省去复制.
+
         Raises:
             InvalidPath: 如果内部路径是非法的.
         """
+        return list(VirtualFileSystem.__convert_inner_path_to_tuple_path(path))
+
+    @staticmethod
+    @lru_cache(maxsize=INNER_PATH_CACHE_SIZE)
+    def __convert_inner_path_to_tuple_path(path: str) -> tuple:
+        """'内部路径'转换成元组形式的'列表路径' (结果以内部路径为键做 LRU 缓存, 所以是不可变的元组) .
+
+        Notes:
+            * 其中的名称是驻留的 (和目录树中的结点的名称一样) , 所以在目录的子结点字典中查找它们时, 比较键只需比较一次地址.
+
+        Raises:
+            InvalidPath: 如果内部路径是非法的 (非法的路径不会被缓存) .
+        """
         # 条件检查.
         VirtualFileSystem.__check_inner_path_validity(path)  # 检查内部条件是否合法.
 
         if not path:  # 对当前路径的处理.
-            return []
+            return ()
         if path == "/":  # 对根路径的处理.
-            return ['/']
+            return ('/',)
         # 绝对路径和相对路径的处理.
         if path.startswith('/'):
-            result = ['/'] + path.strip('/').split('/')  # 注:''.split('/')的结果是[''], 不过在这里并不会发生 (当然, 是在满足了Warnings的要求后) .
+            result = ('/',) + tuple(map(sys.intern, path.strip('/').split('/')))  # 注:''.split('/')的结果是[''], 不过在这里并不会发生 (当然, 是在满足了Warnings的要求后) .
         else:
-            result = path.strip('/').split('/')
+            result = tuple(map(sys.intern, path.strip('/').split('/')))
         return result
 
     @staticmethod
@@ -232,6 +277,9 @@ class VirtualFileSystem:
     def __is_outer_path_contained(container_outer_path: str, contained_outer_path: str) -> bool:
         """检查外部路径 contained_outer_path 是否包含在外部路径 container_outer_path 中.
 
+        Warnings:
+            * 两个路径都必须是由 `os.path.realpath` (和 `os.path.normcase`) 得到的, 这里只比较前缀.
+
         Args:
             container_outer_path: 容器外部路径.
             contained_outer_path: 被包含的外部路径.
@@ -239,15 +287,158 @@ class VirtualFileSystem:
         Returns:
             如果 contained_outer_path 包含在 container_outer_path 中, 返回 True, 否则返回 False.
         """
-        # 将路径转换为绝对路径
-        container_outer_path = os.path.abspath(container_outer_path)
-        contained_outer_path = os.path.abspath(contained_outer_path)
-        # 获取相对路径
-        rel_path = os.path.relpath(contained_outer_path, container_outer_path)
-        # 如果相对路径不以 '..' 开头, 则 contained_path 包含在 container_path 中
-        return not rel_path.startswith('..') and not os.path.isabs(rel_path)
-
-    def __copy_file_from_outside(self, outer_path: str, inner_path: list) -> None:
+        # 加上末尾的分隔符再比较前缀, 以免把 '/a/bc' 当作包含在 '/a/b' 中.
+        return (contained_outer_path == container_outer_path
+                or contained_outer_path.startswith(os.path.join(container_outer_path, '')))
+
+    def __is_root_dir_contained(self, outer_path: str) -> bool:
+        """检查根目录是否包含在外部路径中.
+
+        Notes:
+            * 比较的是真实路径, 所以通过符号链接指向根目录 (或其上层目录) 的外部路径也会被发现.
+
+        Args:
+            outer_path: 外部路径.
+
+        Returns:
+            如果根目录包含在外部路径中, 返回 True, 否则返回 False.
+        """
+        return self.__is_outer_path_contained(os.path.normcase(os.path.realpath(outer_path)), self._root_real_path)
+
+    def __get_entity_file_path(self, file_id: str) -> str:
+        """得到指定散列值的实体文件的路径.
+
+        Notes:
+            * 实体文件按散列值的前 `ENTITY_SHARD_LENGTH` 个字符分到实体文件集目录的子目录中, 文件名是散列值剩下的部分
+              (和 git 的对象目录一样) , 这样每个目录中的文件数都不会太多, 在目录中查找, 创建和删除文件都更快.
+        """
+        return f"{self._entity_file_path_prefix}{file_id[:ENTITY_SHARD_LENGTH]}{os.sep}{file_id[ENTITY_SHARD_LENGTH:]}"
+
+    def __prepare_entity_file_path(self, file_id: str) -> str:
+        """得到要写入的指定散列值的实体文件的路径, 并确保它所在的子目录存在 (每个子目录只检查一次) .
+
+        Notes:
+            * 写入一个等待删除的实体文件 (引用计数减为 0 之后又导入了相同的文件) 时, 不再删除它.
+        """
+        self._entity_files_to_remove.discard(file_id)
+        shard = file_id[:ENTITY_SHARD_LENGTH]
+        if shard not in self._entity_shard_dirs:
+            os.makedirs(self._entity_file_path_prefix + shard, exist_ok=True)
+            self._entity_shard_dirs.add(shard)
+        return self.__get_entity_file_path(file_id)
+
+    def __shard_flat_entity_files(self) -> None:
+        """把直接放在实体文件集目录中的实体文件 (以前的布局) 移动到对应的子目录中.
+
+        Notes:
+            * 实体文件集目录中直接放着的只有子目录 (和导入时的临时文件) , 所以每次初始化时检查一遍的开销很小.
+        """
+        with os.scandir(self._entity_files_dir) as it:
+            file_ids = [entry.name for entry in it
+                        if entry.is_file(follow_symlinks=False) and not entry.name.startswith(INGEST_TMP_FILE_PREFIX)]
+        for file_id in file_ids:
+            os.replace(self._entity_file_path_prefix + file_id, self.__prepare_entity_file_path(file_id))
+
+    @staticmethod
+    def __stat_outer_path(outer_path: str) -> os.stat_result:
+        """查询外部路径 (跟随链接) 的状态, 检查它是否存在和它的类型只需这一次系统调用.
+
+        Raises:
+            FileNotFoundError: 如果外部路径不存在 (与 `os.path.exists` 一致, 不能访问的路径也视为不存在) .
+        """
+        try:
+            return os.stat(outer_path)
+        except (OSError, ValueError):
+            raise FileNotFoundError(f"外部路径'{outer_path}'不存在") from None
+
+    @staticmethod
+    def __get_outer_file_key(file_stat: os.stat_result) -> tuple:
+        """由外部文件的状态得到缓存它的散列值时使用的键.
+
+        Notes:
+            * 除了所在的设备, inode, 大小和修改时间之外, 还包含状态改变时间 (ctime) : 修改时间是可以随意设置的 (比如解压时) ,
+              而修改文件的内容总会更新状态改变时间, 这样删除一个文件之后 inode 被新文件复用时也不会误用旧的散列值.
+        """
+        return (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ctime_ns)
+
+    def __get_cached_outer_file_id(self, file_stat: os.stat_result) -> Union[str, None]:
+        """查询已经计算过的外部文件的散列值.
+
+        Notes:
+            * 反复导入同一个外部目录时, 没有改变过的文件只需要查询一次状态, 不用再读取一遍来计算散列值.
+            * 缓存只在内存中, 随该对象一起丢弃.
+
+        Returns:
+            该外部文件的散列值, 如果没有缓存则返回 None.
+        """
+        key = self.__get_outer_file_key(file_stat)
+        file_id = self._outer_file_id_cache.get(key)
+        if file_id is not None:
+            self._outer_file_id_cache.move_to_end(key)
+        return file_id
+
+    def __cache_outer_file_id(self, file_stat: os.stat_result, file_id: str, stat_time_ns: int) -> None:
+        """缓存外部文件的散列值.
+
+        Notes:
+            * 如果该文件的状态是在查询它的状态之前的 `OUTER_FILE_RACY_INTERVAL_NS` 之内改变的, 则不缓存:
+              文件系统记录的时间的精度有限, 之后马上修改它时状态可能不变 (与 git 处理 "racy" 的文件的方法相同) .
+
+        Args:
+            file_stat: 计算散列值之前查询的该外部文件的状态.
+            file_id: 该外部文件的散列值.
+            stat_time_ns: 查询状态时的时间 (`time.time_ns()`) .
+        """
+        if OUTER_FILE_ID_CACHE_SIZE <= 0 or stat_time_ns - file_stat.st_ctime_ns < OUTER_FILE_RACY_INTERVAL_NS:
+            return
+        cache = self._outer_file_id_cache
+        key = self.__get_outer_file_key(file_stat)
+        cache[key] = file_id
+        cache.move_to_end(key)
+        if len(cache) > OUTER_FILE_ID_CACHE_SIZE:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def __normalize_type_filter(type_filter: Union[list, set, frozenset]) -> frozenset:
+        """将扩展名的列表 (或集合) 转换为小写的, 不带 '.' 的扩展名的集合 (判断一个扩展名是否在其中是 O(1) 的) .
+
+        Args:
+            type_filter: 扩展名的列表或集合, 其中的空字符串表示没有扩展名.
+
+        Returns:
+            扩展名的集合.
+        """
+        return frozenset(file_type.lower().lstrip('.') for file_type in type_filter)
+
+    @staticmethod
+    def __is_type_matched(name: str, type_filter: frozenset) -> bool:
+        """检查一个文件名是否满足扩展名的集合.
+
+        Args:
+            name: 文件名.
+            type_filter: 由 `__normalize_type_filter` 得到的扩展名的集合.
+
+        Notes:
+            * 没有 '.' 的文件名, 以及只在开头有 '.' 的文件名 (比如 '.bashrc', 与 `os.path.splitext` 一致) 都没有扩展名,
+              它们只和空字符串匹配 (名为 'txt' 的文件不会被当作扩展名是 'txt' 的文件) .
+
+        Returns:
+            如果该文件名的扩展名在集合中 (或者它没有扩展名而集合中有空字符串) , 返回 True, 否则返回 False.
+        """
+        dot = name.rfind('.')  # 不用 `split`, 省去生成整个列表.
+        if dot <= 0:  # 如果没有扩展名.
+            return "" in type_filter
+        return name[dot + 1:].lower() in type_filter
+
+    def __copy_file_from_outside(
+        self,
+        outer_path: str,
+        inner_path: list,
+        file_id: str = None,
+        dir_entry: os.DirEntry = None,
+        move: bool = False,
+        outer_stat: os.stat_result = None
+    ) -> None:
         """向指定路径以复制的方式添加一个外部文件 (包含文件名)  (非覆盖式) .
 
         Warnings:
@@ -259,6 +450,11 @@ class VirtualFileSystem:
         Args:
             outer_path: 外部路径.
             inner_path: 列表路径.
+            file_id: 该外部文件的散列值 (如果已经计算过了的话) , 为 None 时在这里计算.
+            dir_entry: 遍历外部目录时得到的该外部文件的 `os.DirEntry` (如果有的话) , 它缓存了文件类型, 有它时就不用再查询外部路径了.
+            move: 是否可以把外部文件直接移动 (重命名) 为实体文件 (见 `__move_to_entity_file`) , 由调用者在之后删除外部文件
+                (如果它还在的话) .
+            outer_stat: 外部路径的状态 (如果已经查询过了的话, 见 `__stat_outer_path`) , 为 None 时在这里查询.
 
         Raises:
             FileNotFoundError: 如果外部路径不存在.
@@ -272,26 +468,57 @@ class VirtualFileSystem:
         def copy_file_from_outside_help(src_file_path: str) -> None:
             """复制外部指定文件到实体文件集目录 (目标文件名是hash_value) .
 
-            Warnings:
-                -目标文件名必须是不存在的, 否则在Windows中会导致异常.
+            Args:
+                src_file_path: 外部的源文件路径名, 对应的必须是一个文件.
+
+            Raises:
+                其他由外部文件操作引发的异常也可能发生.
+            """
+            FileCopier.copy_file(src_file_path, self.__prepare_entity_file_path(file_id))
+
+        def ingest_file_from_outside_help(src_file_path: str) -> str:
+            """复制外部指定文件到实体文件集目录的同时计算它的散列值, 并维护引用计数.
+
+            Notes:
+                * 外部文件只读取一遍: 先边计算边复制到一个临时文件, 再根据散列值决定是把它重命名为实体文件还是删除它 (并增加引用) .
 
             Args:
                 src_file_path: 外部的源文件路径名, 对应的必须是一个文件.
 
+            Returns:
+                该文件的散列值.
+
             Raises:
                 其他由外部文件操作引发的异常也可能发生.
             """
-            tmp_dir = self._entity_files_dir
-            shutil.copy(src_file_path, tmp_dir)
-            os.rename(os.path.join(tmp_dir, os.path.basename(src_file_path)),
-                      os.path.join(self._entity_files_dir, file_id))
+            tmp_path = f"{self._entity_file_path_prefix}{INGEST_TMP_FILE_PREFIX}{os.getpid()}.{uuid.uuid4().hex}"
+            try:
+                hash_value = FileHashCalculator.copy_and_calculate_file_hash(src_file_path, tmp_path)
+                if self.is_file_exist_via_file_id(hash_value):  # 如果已经有了, 则删除临时文件并增加引用.
+                    os.remove(tmp_path)
+                    self._file_quote_count_manager.add_quote_count_for_id(hash_value)
+                else:  # 如果没有, 则将临时文件作为实体文件 (与 `shutil.copy` 一样保留权限位) 并创建引用.
+                    shutil.copymode(src_file_path, tmp_path)
+                    os.replace(tmp_path, self.__prepare_entity_file_path(hash_value))
+                    self._file_quote_count_manager.create_quote_count_for_id(hash_value)
+            finally:  # 出错时不留下临时文件 (成功时它已经不在了, 直接尝试删除, 不用先查询一次) .
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+            return hash_value
 
         # 条件检查.
-        if not os.path.exists(outer_path):
-            raise FileNotFoundError(f"外部路径'{outer_path}'不存在")
-        if not os.path.isfile(outer_path):
+        stat_time_ns = time.time_ns()
+        if dir_entry is None:
+            file_stat = outer_stat if outer_stat is not None else self.__stat_outer_path(outer_path)
+            if not stat.S_ISREG(file_stat.st_mode):
+                raise IsADirectoryError(f"外部路径'{outer_path}'存在但不对应一个文件")
+        elif not dir_entry.is_file():
             raise IsADirectoryError(f"外部路径'{outer_path}'存在但不对应一个文件")
-        if self.__is_outer_path_contained(outer_path, self._root_dir):
+        else:
+            file_stat = dir_entry.stat()
+        if dir_entry is None and self.__is_root_dir_contained(outer_path):  # 有 dir_entry 时, 它所在的目录已经检查过了.
             raise InvalidOperation("不允许外部路径包含根路径")
         if not inner_path:
             raise InvalidCurrentDirOperation("该列表路径不能是当前路径")
@@ -300,19 +527,62 @@ class VirtualFileSystem:
         if self._dir_tree_handler.is_path_exists(inner_path):  # 如果目标路径是存在的.
             raise PathExists(f"路径'{inner_path}'已经存在, 不能覆盖它")
 
-        # 计算该文件的散列值.
-        file_id = FileHashCalculator.calculate_file_hash(outer_path)
         # 检查该文件的散列值是否已经有了.
-        if self.is_file_exist_via_file_id(file_id):  # 如果有, 则增加引用.
+        if file_id is None:
+            file_id = self.__get_cached_outer_file_id(file_stat)
+        if file_id is None and move:  # 如果可以移动, 则先在原地计算散列值 (之后可能不需要复制) .
+            file_id = FileHashCalculator.calculate_file_hash(outer_path)
+            self.__cache_outer_file_id(file_stat, file_id, stat_time_ns)
+        if file_id is None:  # 如果还没有计算过散列值, 则边复制边计算.
+            file_id = ingest_file_from_outside_help(outer_path)
+            self.__cache_outer_file_id(file_stat, file_id, stat_time_ns)
+        elif self.is_file_exist_via_file_id(file_id):  # 如果有, 则增加引用.
             self._file_quote_count_manager.add_quote_count_for_id(file_id)
-        else:  # 如果没有, 则复制该文件到实体文件集目录并创建引用.
-            copy_file_from_outside_help(outer_path)
+        else:  # 如果没有, 则移动或复制该文件到实体文件集目录并创建引用.
+            if not (move and self.__move_to_entity_file(outer_path, file_id)):
+                copy_file_from_outside_help(outer_path)
             self._file_quote_count_manager.create_quote_count_for_id(file_id)
         # 增加该文件并填上file_id.
-        self._dir_tree_handler.create_file(inner_path)
-        self._dir_tree_handler.set_file_hash(inner_path, file_id)
+        self._dir_tree_handler.create_file(inner_path, file_id)
+
+    def __move_to_entity_file(self, outer_path: str, file_id: str) -> bool:
+        """尝试把外部文件直接移动 (重命名) 为实体文件集目录中的指定散列值的实体文件.
+
+        Notes:
+            * 外部文件和实体文件集目录在同一个文件系统中时, 重命名只修改目录项, 不需要读写文件的内容.
+            * 以下情况不移动, 由调用者改为复制:
+              - 外部文件和实体文件集目录不在同一个文件系统中 (`EXDEV`) ;
+              - 外部路径是一个链接 (否则移动的是链接本身) ;
+              - 外部文件还有别的硬链接 (否则通过它们修改文件时会改变实体文件) .
 
-    def __copy_dir_from_outside(self, outer_path: str, inner_path: list) -> None:
+        Args:
+            outer_path: 外部文件的路径, 对应的必须是一个文件.
+            file_id: 该外部文件的散列值, 对应的实体文件必须还不存在.
+
+        Returns:
+            是否已经移动.
+
+        Raises:
+            其他由外部文件操作引发的异常也可能发生.
+        """
+        file_stat = os.lstat(outer_path)
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_nlink != 1:
+            return False
+        try:  # 用 `os.replace`, 实体文件还在 (等待删除) 时在 Windows 上也会被替换.
+            os.replace(outer_path, self.__prepare_entity_file_path(file_id))
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                return False
+            raise
+        return True
+
+    def __copy_dir_from_outside(
+        self,
+        outer_path: str,
+        inner_path: list,
+        move: bool = False,
+        outer_stat: os.stat_result = None
+    ) -> None:
         """向指定路径以复制的方式添加一个外部目录 (包含目录名)  (非覆盖式) .
 
         Warnings:
@@ -324,6 +594,8 @@ class VirtualFileSystem:
         Args:
             outer_path: 外部路径.
             inner_path: 列表路径.
+            move: 是否可以把其中的外部文件直接移动为实体文件 (见 `__copy_dir_content_from_outside`) .
+            outer_stat: 外部路径的状态 (如果已经查询过了的话, 见 `__stat_outer_path`) , 为 None 时在这里查询.
 
         Raises:
             FileNotFoundError: 如果外部路径不存在.
@@ -335,11 +607,11 @@ class VirtualFileSystem:
             其他由外部文件操作引发的异常也可能发生.
         """
         # 条件检查.
-        if not os.path.exists(outer_path):
-            raise FileNotFoundError(f"外部路径'{outer_path}'不存在")
-        if not os.path.isdir(outer_path):
+        if outer_stat is None:
+            outer_stat = self.__stat_outer_path(outer_path)
+        if not stat.S_ISDIR(outer_stat.st_mode):
             raise NotADirectoryError(f"外部路径'{outer_path}'存在但不对应一个目录")
-        if self.__is_outer_path_contained(outer_path, self._root_dir):
+        if self.__is_root_dir_contained(outer_path):
             raise InvalidOperation("不允许外部路径包含根路径")
         if not inner_path:
             raise InvalidCurrentDirOperation("该列表路径不能是当前路径")
@@ -348,15 +620,110 @@ class VirtualFileSystem:
         if self._dir_tree_handler.is_path_exists(inner_path):  # 如果目标路径是存在的.
             raise PathExists(f"路径'{inner_path}'已经存在, 不能覆盖它")
 
-        # 创建一个目录结点.
+        # 创建一个目录结点, 再添加目录中的内容.
         self._dir_tree_handler.mkdir(inner_path)
-        # 遍历目录中的内容.
-        for entry in os.listdir(outer_path):  # 对于既不是目录也不是普通文件的东西, 这里直接忽略.
-            full_path = os.path.join(outer_path, entry)
-            if os.path.isdir(full_path):  # 如果是一个目录, 递归调用自己.
-                self.__copy_dir_from_outside(full_path, inner_path + [entry])
-            elif os.path.isfile(full_path):  # 如果是一个文件, 调用self.__copy_file_from_outside进行处理.
-                self.__copy_file_from_outside(full_path, inner_path + [entry])
+        self.__copy_dir_content_from_outside(outer_path, inner_path, move=move)
+
+    def __copy_dir_content_from_outside(
+        self,
+        outer_path: str,
+        inner_path: list,
+        file_filter=None,
+        move: bool = False
+    ) -> None:
+        """把外部目录中的内容 (不包括它自己) 复制到已经存在的内部目录中 (非覆盖式) .
+
+        Warnings:
+            * 现在只能处理目录和普通文件, 不能处理别的比如链接之类的东西, 现在的做法是略过它们.
+            * 条件检查由调用者完成.
+
+        Notes:
+            * 分成几步进行, 而不是逐个目录地处理, 这样每一步都可以一次处理整棵树中的所有文件:
+              1. 用一个栈迭代地遍历外部目录, 按原来的顺序记下要创建的目录和要添加的文件;
+              2. 用一个线程池计算所有要添加的文件的散列值 (目录很多而每个目录中的文件很少时也能充分并行) ,
+                 状态没有改变过的文件直接使用缓存的散列值 (见 `__get_cached_outer_file_id`) ;
+              3. 用一个线程池把其中新的 (即实体文件集中还没有的) 文件复制到实体文件集目录 (相同的文件只复制一次) ,
+                 可以移动时先尝试直接移动 (见 `__move_to_entity_file`) , 只复制不能移动的文件;
+              4. 依次修改目录树, 最后通过一次 `add_quote_count_for_ids` 增加所有文件的引用计数 (不存在时创建) .
+              于是计算散列值或者读取外部文件出错时, 目录树还没有被修改.
+            * 指向自己所在的目录 (或其上层目录) 的链接会被略过, 否则会无限地遍历下去.
+            * 通过指向目录的链接到达的文件 (可能在外部目录之外) 只复制, 不移动: 调用者之后删除外部目录时只删除链接本身,
+              链接指向的目录不应该因此而改变.
+            * 添加文件时原地修改 (并恢复) 所在目录的列表路径, 只有子目录才有自己的列表路径.
+
+        Args:
+            outer_path: 外部目录的路径.
+            inner_path: 列表路径, 对应的目录必须已经存在.
+            file_filter: 根据文件名判断是否添加一个文件的函数, 为 None 时添加所有文件.
+            move: 是否可以把外部文件直接移动为实体文件 (只对不经过链接就能到达的文件有效) , 由调用者在之后删除外部目录.
+
+        Raises:
+            其他由外部文件操作引发的异常也可能发生.
+        """
+        # 遍历外部目录, 按顺序记下 (所在的内部目录, 外部的 `DirEntry`) , 是目录还是文件由 `DirEntry` 区分.
+        items = []
+        movable_paths = set()  # 可以移动的外部文件的路径.
+        pending_dirs = [(outer_path, inner_path, move)]  # 待遍历的 (外部目录, 对应的内部目录, 其中的文件是否可以移动) .
+        while pending_dirs:
+            outer_dir, inner_dir, is_movable = pending_dirs.pop()
+            # 读取目录中的内容 (`os.scandir` 得到的 `DirEntry` 缓存了文件类型, 不用再对每一项查询一次) .
+            with os.scandir(outer_dir) as it:
+                entries = list(it)
+            sub_dirs = []
+            for entry in entries:  # 对于既不是目录也不是普通文件的东西, 这里直接忽略.
+                if entry.is_dir():
+                    if entry.is_symlink() and self.__is_outer_path_contained(
+                            os.path.normcase(os.path.realpath(entry.path)),
+                            os.path.normcase(os.path.realpath(outer_dir))):
+                        continue
+                    sub_dirs.append((entry.path, inner_dir + [entry.name], is_movable and not entry.is_symlink()))
+                    items.append((inner_dir, entry))
+                elif entry.is_file() and (file_filter is None or file_filter(entry.name)):
+                    items.append((inner_dir, entry))
+                    if is_movable:
+                        movable_paths.add(entry.path)
+            pending_dirs.extend(reversed(sub_dirs))  # 按目录中的顺序遍历子目录.
+        # 计算所有文件的散列值 (已经缓存了的除外) .
+        file_ids = {}
+        uncached_files = []  # 各个 (外部文件的路径, 它的状态) .
+        stat_time_ns = time.time_ns()
+        for _, entry in items:
+            if entry.is_dir():
+                continue
+            file_stat = entry.stat()
+            file_id = file_ids[entry.path] = self.__get_cached_outer_file_id(file_stat)  # 保持原来的顺序.
+            if file_id is None:
+                uncached_files.append((entry.path, file_stat))
+        uncached_file_ids = FileHashCalculator.calculate_many([file_path for file_path, _ in uncached_files])
+        for (file_path, file_stat), file_id in zip(uncached_files, uncached_file_ids):
+            file_ids[file_path] = file_id
+            self.__cache_outer_file_id(file_stat, file_id, stat_time_ns)
+        # 复制 (或移动) 新的文件.
+        new_files = {}
+        for file_path, file_id in file_ids.items():
+            if file_id not in new_files and not self.is_file_exist_via_file_id(file_id):
+                new_files[file_id] = file_path
+        if movable_paths:
+            new_files = {file_id: file_path for file_id, file_path in new_files.items()
+                         if file_path not in movable_paths or not self.__move_to_entity_file(file_path, file_id)}
+        FileCopier.copy_many([(file_path, self.__prepare_entity_file_path(file_id))
+                              for file_id, file_path in new_files.items()])
+        # 修改目录树 (内部目录是新建的, 不会和已有的结点冲突) , 再一次增加 (或创建) 所有已经添加的文件的引用计数.
+        added_file_ids = []
+        try:
+            for inner_dir, entry in items:
+                inner_dir.append(entry.name)  # 原地加上名称, 而不是为每一项复制一遍目录的路径.
+                try:
+                    if entry.is_dir():  # 如果是一个目录, 创建对应的目录结点.
+                        self._dir_tree_handler.mkdir(inner_dir)
+                    else:  # 如果是一个文件, 创建对应的文件结点并填上file_id (实体文件已经有了) .
+                        file_id = file_ids[entry.path]
+                        self._dir_tree_handler.create_file(inner_dir, file_id)
+                        added_file_ids.append(file_id)
+                finally:
+                    inner_dir.pop()
+        finally:  # 即使中途出错, 已经添加的文件的引用计数也要和目录树一致.
+            self._file_quote_count_manager.add_quote_count_for_ids(added_file_ids)
 
     def __copy_file_to_outside(self, inner_path: list, outer_path: str) -> None:
         """向外部指定路径以复制的方式添加内部文件 (非覆盖式) .
@@ -379,7 +746,7 @@ class VirtualFileSystem:
             raise PathNotExists(f"列表路径'{inner_path}'不存在")
         if self._dir_tree_handler.is_dir(inner_path):
             raise PathIsNotFile(f"列表路径'{inner_path}'存在但不对应一个文件")
-        if self.__is_outer_path_contained(outer_path, self._root_dir):
+        if self.__is_root_dir_contained(outer_path):
             raise InvalidOperation("不允许外部路径包含根路径")
         if not os.path.exists(os.path.dirname(outer_path)):
             raise FileNotFoundError(f"外部路径'{outer_path}'所在的目录不存在")
@@ -388,8 +755,7 @@ class VirtualFileSystem:
 
         file_id = self._dir_tree_handler.get_file_hash(inner_path)  # 获取文件的散列值
         # 将该散列值的文件复制到指定位置.
-        shutil.copy(os.path.join(self._entity_files_dir, file_id), os.path.dirname(outer_path))
-        os.rename(os.path.join(os.path.dirname(outer_path), file_id), outer_path)
+        FileCopier.copy_file(self.__get_entity_file_path(file_id), outer_path)
 
     def __copy_dir_to_outside(self, inner_path: list, outer_path: str) -> None:
         """向外部指定路径以复制的方式添加内部目录 (非覆盖式) .
@@ -415,48 +781,49 @@ class VirtualFileSystem:
             raise PathNotExists(f"列表路径'{inner_path}'不存在")
         if not self._dir_tree_handler.is_dir(inner_path):
             raise PathIsNotDir(f"列表路径'{inner_path}'存在但不对应一个目录")
-        if self.__is_outer_path_contained(outer_path, self._root_dir):
+        if self.__is_root_dir_contained(outer_path):
             raise InvalidOperation("不允许外部路径包含根路径")
         if not os.path.exists(os.path.dirname(outer_path)):
             raise FileNotFoundError(f"外部路径'{outer_path}'所在的目录不存在")
         if os.path.exists(outer_path):  # 如果外部路径存在.
             raise FileExistsError(f"外部路径'{outer_path}'已经存在, 不能覆盖它")
 
-        # 创建一个目录
-        os.mkdir(outer_path)
-        # 获得目录的内容.
-        contents = self._dir_tree_handler.get_dir_content(inner_path)
-        # 遍历目录.
-        for item in contents:
-            path_tmp = inner_path + [item]
-            if not self._dir_tree_handler.is_dir(path_tmp):  # 如果是一个文件, 将它复制到目录中.
-                self.__copy_file_to_outside(path_tmp, os.path.join(outer_path, item))
-            else:  # 如果是一个目录, 递归调用自己.
-                self.__copy_dir_to_outside(path_tmp, os.path.join(outer_path, item))
-
-    def __add_quote_count_for_files_in_dir(self, dir_path: list) -> None:
-        """对目录中的文件递归的增加引用计数.
+        self.__copy_dir_content_to_outside(inner_path, outer_path)
+
+    def __copy_dir_content_to_outside(self, inner_path: list, outer_path: str, file_filter=None) -> None:
+        """把内部目录 (包括它自己) 复制到外部的指定路径 (非覆盖式) .
+
+        Warnings:
+            * 条件检查由调用者完成.
+
+        Notes:
+            * 内部目录只解析一次 (通过 `DirTreeHandler.walk`) , 而不是对其中的每个结点都解析一次.
+            * 先创建所有的目录并记下要复制的文件, 再用一个线程池一起复制它们 (见 `FileCopier.copy_many`) .
+
+        Args:
+            inner_path: 列表路径, 对应的必须是一个目录.
+            outer_path: 外部路径, 它所在的目录必须存在.
+            file_filter: 根据文件名判断是否复制一个文件的函数, 为 None 时复制所有文件.
 
         Raises:
-            PathNotExists: 如果该列表路径不存在.
-            PathIsNotDir: 如果该列表路径存在但不对应一个目录.
+            FileExistsError: 如果要创建的外部路径已经存在.
+            FileIDNotFound: 如果这个目录中存在一个文件没有file_id.
+            其他由外部文件操作引发的异常也可能发生.
         """
-        # 条件检查.
-        if not self._dir_tree_handler.is_path_exists(dir_path):
-            raise PathNotExists(f"列表路径'{dir_path}'不存在")
-        if not self._dir_tree_handler.is_dir(dir_path):
-            raise PathIsNotDir(f"列表路径'{dir_path}'存在但不对应一个目录")
-
-        # 获得目录的内容
-        contents = self._dir_tree_handler.get_dir_content(dir_path)
-        # 遍历目录
-        for item in contents:
-            path_tmp = dir_path + [item]
-            if not self._dir_tree_handler.is_dir(path_tmp):  # 如果是一个文件, 增加它的引用计数
-                file_id = self._dir_tree_handler.get_file_hash(path_tmp)
-                self._file_quote_count_manager.add_quote_count_for_id(file_id)
-            else:  # 如果是一个目录, 递归调用自己
-                self.__add_quote_count_for_files_in_dir(path_tmp)
+        src_dst_pairs = []
+        for relative_path, _, files in self._dir_tree_handler.walk(inner_path):
+            # 创建对应的目录 (先于它的子目录) .
+            outer_dir = os.path.join(outer_path, *relative_path)
+            os.mkdir(outer_dir)
+            # 记下其中的 (满足条件的) 文件要复制到的位置.
+            for name, file_id in files:
+                if file_filter is not None and not file_filter(name):
+                    continue
+                if file_id is None:
+                    raise FileIDNotFound(f"列表路径'{inner_path + relative_path + [name]}'存在且是一个文件但没有file_id")
+                src_dst_pairs.append((self.__get_entity_file_path(file_id), os.path.join(outer_dir, name)))
+        # 复制所有的文件.
+        FileCopier.copy_many(src_dst_pairs, exclusive=True)
 
     def __sub_quote_count_for_files_in_dir(self, dir_path: list) -> None:
         """对目录中的文件递归的减少引用计数.
@@ -471,24 +838,42 @@ class VirtualFileSystem:
         if not self._dir_tree_handler.is_dir(dir_path):
             raise PathIsNotDir(f"列表路径'{dir_path}'存在但不对应一个目录")
 
-        # 获得目录的内容.
-        contents = self._dir_tree_handler.get_dir_content(dir_path)
-        # 遍历目录.
-        for item in contents:
-            path_tmp = dir_path + [item]
-            if not self._dir_tree_handler.is_dir(path_tmp):  # 如果是一个文件, 减少它的引用计数 (当减为 0 时, 将这个实体文件删除) .
-                file_id = self._dir_tree_handler.get_file_hash(path_tmp)
-                if self._file_quote_count_manager.sub_quote_count_for_id(file_id):
-                    os.remove(os.path.join(self._entity_files_dir, file_id))
-            else:  # 如果是一个目录, 递归调用自己.
-                self.__sub_quote_count_for_files_in_dir(path_tmp)
+        # 先收集所有文件的file_id, 再一次性减少它们的引用计数 (计数减为 0 的实体文件在保存时删除) .
+        file_ids = list(self.__iter_file_ids_in_dir(dir_path))
+        self._entity_files_to_remove.update(self._file_quote_count_manager.sub_quote_count_for_ids(file_ids))
+
+    def __remove_entity_files(self, file_ids) -> None:
+        """删除多个实体文件 (file_ids 是它们的file_id的可迭代对象) .
+
+        Notes:
+            * `os.remove` 会释放GIL, 所以多于一个时使用线程池并行地删除 (在 SSD 或网络文件系统上可以隐藏延迟) .
+        """
+        entity_file_paths = [self.__get_entity_file_path(file_id) for file_id in file_ids]
+        if len(entity_file_paths) <= 1:
+            for entity_file_path in entity_file_paths:
+                os.remove(entity_file_path)
+            return
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(os.remove, entity_file_paths))
+
+    def __iter_file_ids_in_dir(self, dir_path: list):
+        """依次得到目录中 (包括子目录中) 的所有文件的file_id.
+
+        Raises:
+            FileIDNotFound: 如果这个目录中存在一个文件没有file_id.
+        """
+        for relative_path, _, files in self._dir_tree_handler.walk(dir_path):
+            for name, file_id in files:
+                if file_id is None:
+                    raise FileIDNotFound(f"列表路径'{dir_path + relative_path + [name]}'存在且是一个文件但没有file_id")
+                yield file_id
 
     # 后续添加
     def __copy_dir_from_outside_ex(
         self,
         outer_path: str,
         inner_path: list,
-        type_filter: list
+        type_filter: frozenset
     ) -> None:
         """向指定路径以复制的方式添加一个外部目录 (包含目录名) , 只添加指定后缀的文件 (非覆盖式) .
 
@@ -501,6 +886,7 @@ class VirtualFileSystem:
         Args:
             outer_path: 外部路径.
             inner_path: 列表路径.
+            type_filter: 由 `__normalize_type_filter` 得到的扩展名的集合.
 
         Raises:
             FileNotFoundError: 如果外部路径不存在.
@@ -512,11 +898,9 @@ class VirtualFileSystem:
             其他由外部文件操作引发的异常也可能发生.
         """
         # 条件检查.
-        if not os.path.exists(outer_path):
-            raise FileNotFoundError(f"外部路径'{outer_path}'不存在")
-        if not os.path.isdir(outer_path):
+        if not stat.S_ISDIR(self.__stat_outer_path(outer_path).st_mode):
             raise NotADirectoryError(f"外部路径'{outer_path}'存在但不对应一个目录")
-        if self.__is_outer_path_contained(outer_path, self._root_dir):
+        if self.__is_root_dir_contained(outer_path):
             raise InvalidOperation("不允许外部路径包含根路径")
         if not inner_path:
             raise InvalidCurrentDirOperation("该列表路径不能是当前路径")
@@ -525,25 +909,19 @@ class VirtualFileSystem:
         if self._dir_tree_handler.is_path_exists(inner_path):  # 如果目标路径是存在的.
             raise PathExists(f"路径'{inner_path}'已经存在, 不能覆盖它")
 
-        # 创建一个目录结点.
+        def file_filter(name: str) -> bool:
+            """判断文件是否满足相应的扩展名."""
+            return self.__is_type_matched(name, type_filter)
+
+        # 创建一个目录结点, 再添加目录中的满足相应的扩展名的文件 (以及所有子目录) .
         self._dir_tree_handler.mkdir(inner_path)
-        # 遍历目录中的内容.
-        for entry in os.listdir(outer_path):  # 对于既不是目录也不是普通文件的东西, 这里直接忽略.
-            full_path = os.path.join(outer_path, entry)
-            if os.path.isdir(full_path):  # 如果是一个目录, 递归调用自己.
-                self.__copy_dir_from_outside_ex(full_path, inner_path + [entry], type_filter)
-            elif os.path.isfile(full_path):  # 如果是一个文件, 且满足相应的扩展名, 调用self.__copy_file_from_outside进行处理.
-                if "" in type_filter:  # 专门处理一下无扩展名的
-                    if "." not in os.path.basename(full_path):
-                        self.__copy_file_from_outside(full_path, inner_path + [entry])
-                if (os.path.basename(full_path)).split('.')[-1].lower() in type_filter:
-                    self.__copy_file_from_outside(full_path, inner_path + [entry])
+        self.__copy_dir_content_from_outside(outer_path, inner_path, file_filter)
 
     def __copy_dir_to_outside_ex(
         self,
         inner_path: list,
         outer_path: str,
-        type_filter: list
+        type_filter: frozenset
     ) -> None:
         """向外部指定路径以复制的方式添加内部目录, 只添加指定后缀的文件 (非覆盖式) .
 
@@ -553,6 +931,7 @@ class VirtualFileSystem:
         Args:
             inner_path: 列表路径.
             outer_path: 外部路径.
+            type_filter: 由 `__normalize_type_filter` 得到的扩展名的集合.
 
         Raises:
             PathNotExists: 如果列表路径不存在.
@@ -568,28 +947,19 @@ class VirtualFileSystem:
             raise PathNotExists(f"列表路径'{inner_path}'不存在")
         if not self._dir_tree_handler.is_dir(inner_path):
             raise PathIsNotDir(f"列表路径'{inner_path}'存在但不对应一个目录")
-        if self.__is_outer_path_contained(outer_path, self._root_dir):
+        if self.__is_root_dir_contained(outer_path):
             raise InvalidOperation("不允许外部路径包含根路径")
         if not os.path.exists(os.path.dirname(outer_path)):
             raise FileNotFoundError(f"外部路径'{outer_path}'所在的目录不存在")
         if os.path.exists(outer_path):  # 如果外部路径存在.
             raise FileExistsError(f"外部路径'{outer_path}'已经存在, 不能覆盖它")
 
-        # 创建一个目录
-        os.mkdir(outer_path)
-        # 获得目录的内容.
-        contents = self._dir_tree_handler.get_dir_content(inner_path)
-        # 遍历目录.
-        for item in contents:
-            path_tmp = inner_path + [item]
-            if not self._dir_tree_handler.is_dir(path_tmp):  # 如果是一个文件, 且满足指定的后缀, 将它复制到目录中.
-                if "" in type_filter:  # 专门处理一下无扩展名的
-                    if "." not in os.path.basename(path_tmp[-1]):
-                        self.__copy_file_to_outside(path_tmp, os.path.join(outer_path, item))
-                if path_tmp[-1].split('.')[-1].lower() in type_filter:
-                    self.__copy_file_to_outside(path_tmp, os.path.join(outer_path, item))
-            else:  # 如果是一个目录, 递归调用自己.
-                self.__copy_dir_to_outside_ex(path_tmp, os.path.join(outer_path, item), type_filter)
+        def file_filter(name: str) -> bool:
+            """判断文件是否满足相应的扩展名."""
+            return self.__is_type_matched(name, type_filter)
+
+        # 复制目录 (以及所有子目录) 和其中的满足相应的扩展名的文件.
+        self.__copy_dir_content_to_outside(inner_path, outer_path, file_filter)
 
     # 提供给外部的方法
     def store_change(self):
@@ -597,10 +967,14 @@ class VirtualFileSystem:
 
         Notes:
             * 这里有一个很有意思的地方, 即使忘了保存, 也没什么用户集看到的引用计数和实际的引用计数不一致的问题。
-              唯一的问题似乎只是, 引用计数不为0的文件可能已经被删除了, 引用计数为0的文件可能还在 (我们看到这是非常开心的！) .
+              唯一的问题似乎只是, 引用计数为0的文件可能还在 (我们看到这是非常开心的！) .
+            * 引用计数减为 0 的实体文件在这里 (提交了引用计数之后) 才被一起删除 (见 `__remove_entity_files`) , 所以删除操作不用等待
+              删除实体文件, 而且没有保存时引用计数不为0的文件也不会已经被删除了.
         """
         self._dir_tree_handler.store_change()
         self._file_quote_count_manager.store_change()
+        self.__remove_entity_files(self._entity_files_to_remove)
+        self._entity_files_to_remove.clear()
 
     def get_current_dir_path(self) -> str:
         """返回当前目录."""
@@ -612,7 +986,7 @@ class VirtualFileSystem:
         Raises:
             InvalidPath: 如果路径是非法的.
         """
-        path_list = self.__convert_inner_path_to_list_path(path)
+        path_list = self.__convert_inner_path_to_tuple_path(path)
         return self._dir_tree_handler.is_path_exists(path_list)
 
     def chdir(self, dir_path: str) -> None:
@@ -623,7 +997,7 @@ class VirtualFileSystem:
             PathNotExists: 如果该路径不存在.
             PathIsNotDir: 如果该路径存在但不对应一个目录.
         """
-        dir_path_list = self.__convert_inner_path_to_list_path(dir_path)
+        dir_path_list = self.__convert_inner_path_to_tuple_path(dir_path)
         self._dir_tree_handler.chdir(dir_path_list)
 
     def get_metadata_of_path(self, path: str) -> dict:
@@ -633,7 +1007,7 @@ class VirtualFileSystem:
             InvalidPath: 如果路径是非法的.
             PathNotExists: 如果该路径不存在.
         """
-        path = self.__convert_inner_path_to_list_path(path)
+        path = self.__convert_inner_path_to_tuple_path(path)
         return self._dir_tree_handler.get_metadata_of_path(path)
 
     def modify_metadata_of_path(self, path: str, metadata: dict) -> None:
@@ -646,7 +1020,7 @@ class VirtualFileSystem:
             InvalidPath: 如果路径是非法的.
             PathNotExists: 如果该路径不存在.
         """
-        path = self.__convert_inner_path_to_list_path(path)
+        path = self.__convert_inner_path_to_tuple_path(path)
         self._dir_tree_handler.modify_metadata_of_path(path, metadata)
 
     def get_dir_content(self, dir_path: str) -> list:
@@ -660,7 +1034,7 @@ class VirtualFileSystem:
             PathNotExists: 如果该路径不存在.
             PathIsNotDir: 如果该路径存在但不对应一个目录.
         """
-        dir_path = self.__convert_inner_path_to_list_path(dir_path)
+        dir_path = self.__convert_inner_path_to_tuple_path(dir_path)
         return self._dir_tree_handler.get_dir_content(dir_path)
 
     def get_file_content(
@@ -677,6 +1051,9 @@ class VirtualFileSystem:
             * 这里 start 用于 seek, size 用于 read.
             * 当 size 为 None 时, 意味着从 start 一直读到文件末尾.
             * 这里的文件内容读取的行为和 seek、read 是一样的.
+            * 以二进制的形式读取时不经过 Python 的文件缓冲区 (读取一小段时不会先读满一个缓冲区再复制出来) ,
+              内容直接读入到返回的 bytes 对象中. 不想为读取的内容创建新的对象时, 见 `get_file_content_into` 和
+              `get_file_content_view`.
 
         Args:
             file_path: 待读取的文件名.
@@ -694,20 +1071,104 @@ class VirtualFileSystem:
             FileIDNotFound: 如果该路径存在且是一个文件但没有file_id.
             ValueError: 如果请求的范围不合适.
         """
-        file_path_list = self.__convert_inner_path_to_list_path(file_path)
+        file_path_list = self.__convert_inner_path_to_tuple_path(file_path)
         # 获取该文件的散列值
         hash_value = self._dir_tree_handler.get_file_hash(file_path_list)
         # 返回请求的内容
-        entity_file_path = os.path.join(self._entity_files_dir, hash_value)
-        if is_binary:
-            open_mode = 'rb'
-        else:
-            open_mode = 'r'
-        with open(entity_file_path, open_mode) as f:
+        entity_file_path = self.__get_entity_file_path(hash_value)
+        if not is_binary:
+            with open(entity_file_path, 'r') as f:
+                f.seek(start)
+                return f.read(size)
+        if start < 0:  # 与有缓冲的读取一致 (无缓冲时 seek 抛出的是 OSError) .
+            raise ValueError(f"negative seek position {start}")
+        with open(entity_file_path, 'rb', buffering=0) as f:
             f.seek(start)
-            data = f.read(size)
+            data = f.read(size)  # 无缓冲的读取只有一次系统调用 (没有指定大小时一直读到文件末尾) .
+            if size is not None and 0 < len(data) < size:  # 一次系统调用读入的量有上限 (比如 Linux 上约为 2 GiB) .
+                chunks = [data]
+                remaining = size - len(data)
+                while remaining:
+                    chunk = f.read(remaining)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    remaining -= len(chunk)
+                data = b''.join(chunks)
         return data
 
+    def get_file_content_view(self, file_path: str) -> memoryview:
+        """以只读的内存映射的形式查看指定路径的文件的全部内容.
+
+        Notes:
+            * 返回的是实体文件的内存映射的视图, 读取它时直接访问页缓存, 不会把整个文件复制到一个新的 bytes 对象中
+              (需要 bytes 时可以对它切片或者使用 `bytes` 转换, 这时才会复制) .
+            * 使用完之后最好调用它的 `release` (或者用 `with`) , 这样映射会被尽快解除.
+            * 空文件不能被映射, 这时返回一个空的视图.
+
+        Args:
+            file_path: 待读取的文件名.
+
+        Returns:
+            文件的全部内容的只读视图.
+
+        Raises:
+            InvalidPath: 如果路径是非法的.
+            PathNotExists: 如果该路径不存在.
+            PathIsNotFile: 如果该路径存在但不对应一个文件 (而是一个目录) .
+            FileIDNotFound: 如果该路径存在且是一个文件但没有file_id.
+        """
+        file_path_list = self.__convert_inner_path_to_tuple_path(file_path)
+        # 获取该文件的散列值
+        hash_value = self._dir_tree_handler.get_file_hash(file_path_list)
+        # 映射请求的内容
+        with open(self.__get_entity_file_path(hash_value), 'rb', buffering=0) as f:
+            if not os.fstat(f.fileno()).st_size:
+                return memoryview(b'')
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # 关闭文件之后映射仍然有效.
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        return memoryview(mm)  # 视图被释放 (并且没有别的引用) 时, 映射随之被解除.
+
+    def get_file_content_into(self, file_path: str, buffer, start: int = 0) -> int:
+        """把指定路径的文件从指定位置开始的内容读入到调用者提供的缓冲区中 (最多读满该缓冲区) .
+
+        Notes:
+            * 和 `get_file_content` 不同, 这里不为读取的内容创建新的 bytes 对象, 调用者可以反复使用同一个缓冲区
+              (比如分多次读取一个很大的文件) .
+            * 读取不经过 Python 的文件缓冲区, 而是直接读入到给定的缓冲区中.
+
+        Args:
+            file_path: 待读取的文件名.
+            buffer: 可写的缓冲区 (比如 bytearray, memoryview) .
+            start: 指定读取的起始位置 (0 表示开始) .
+
+        Returns:
+            实际读入的字节数 (小于缓冲区的大小时, 说明已经读到了文件末尾) .
+
+        Raises:
+            InvalidPath: 如果路径是非法的.
+            PathNotExists: 如果该路径不存在.
+            PathIsNotFile: 如果该路径存在但不对应一个文件 (而是一个目录) .
+            FileIDNotFound: 如果该路径存在且是一个文件但没有file_id.
+            ValueError: 如果请求的范围不合适.
+        """
+        file_path_list = self.__convert_inner_path_to_tuple_path(file_path)
+        # 获取该文件的散列值
+        hash_value = self._dir_tree_handler.get_file_hash(file_path_list)
+        # 读入请求的内容
+        entity_file_path = self.__get_entity_file_path(hash_value)
+        view = memoryview(buffer).cast('B')
+        total = 0
+        with open(entity_file_path, 'rb', buffering=0) as f:
+            f.seek(start)
+            while total < len(view):  # 无缓冲的读取可能只读入一部分.
+                size = f.readinto(view[total:])
+                if not size:
+                    break
+                total += size
+        return total
+
     def copy_from_outside(self, outer_path: str, inner_path: str) -> None:
         """向指定路径以复制的方式添加一个外部 (即一个本身不在该虚拟文件系统中的) 文件或目录 (原来的文件或目录是不受影响的)  (非覆盖式) .
 
@@ -726,10 +1187,11 @@ class VirtualFileSystem:
             其他由外部文件操作引发的异常也可能发生.
         """
         inner_path_list = self.__convert_inner_path_to_list_path(inner_path)
-        if os.path.isfile(outer_path):  # 如果是一个文件
-            self.__copy_file_from_outside(outer_path, inner_path_list)
+        outer_stat = self.__stat_outer_path(outer_path)  # 只查询一次, 下面的条件检查也使用它.
+        if stat.S_ISREG(outer_stat.st_mode):  # 如果是一个文件
+            self.__copy_file_from_outside(outer_path, inner_path_list, outer_stat=outer_stat)
         else:  # 如果是一个目录
-            self.__copy_dir_from_outside(outer_path, inner_path_list)
+            self.__copy_dir_from_outside(outer_path, inner_path_list, outer_stat=outer_stat)
 
     def move_from_outside(self, outer_path: str, inner_path: str) -> None:
         """向指定路径以移动的方式添加一个外部文件或目录 (原来的文件或目录被删除)  (非覆盖式) .
@@ -737,6 +1199,8 @@ class VirtualFileSystem:
         Notes:
             * 在使用前应检查内部路径是否存在.
             * 如果内部路径存在, 则抛出异常.
+            * 外部路径是一个链接时, 只删除链接本身, 它指向的文件或目录不变 (其中的内容是复制的) ;
+              外部目录中指向目录的链接也是这样, 通过它们到达的文件只复制, 不移动.
 
         Raises:
             InvalidPath: 如果内部路径是非法的.
@@ -748,11 +1212,24 @@ class VirtualFileSystem:
             PathExists: 如果内部路径已经存在.
             其他由外部文件操作引发的异常也可能发生.
         """
-        self.copy_from_outside(outer_path, inner_path)
-        # 删除原文件或目录
-        if os.path.isfile(outer_path):
-            os.remove(outer_path)
-        else:
+        # 与 `copy_from_outside` 相同, 只是外部文件和实体文件集目录在同一个文件系统中时, 新的文件直接移动 (重命名) 为实体文件,
+        # 而不是复制之后再删除.
+        inner_path_list = self.__convert_inner_path_to_list_path(inner_path)
+        outer_stat = self.__stat_outer_path(outer_path)  # 只查询一次, 下面的条件检查也使用它.
+        if stat.S_ISREG(outer_stat.st_mode):  # 如果是一个文件
+            self.__copy_file_from_outside(outer_path, inner_path_list, move=True, outer_stat=outer_stat)
+            # 删除原文件 (如果没有被移动的话)
+            if os.path.lexists(outer_path):
+                os.remove(outer_path)
+        elif os.path.islink(outer_path):  # 如果是一个指向目录的链接, 复制其中的内容, 只删除链接本身 (它指向的目录不变) .
+            self.__copy_dir_from_outside(outer_path, inner_path_list, outer_stat=outer_stat)
+            if os.name == 'nt':  # Windows 上指向目录的链接要像目录一样删除.
+                os.rmdir(outer_path)
+            else:
+                os.remove(outer_path)
+        else:  # 如果是一个目录
+            self.__copy_dir_from_outside(outer_path, inner_path_list, move=True, outer_stat=outer_stat)
+            # 删除原目录 (剩下的, 其中指向目录的链接只删除链接本身)
             shutil.rmtree(outer_path)
 
     def copy_to_outside(self, inner_path: str, outer_path: str) -> None:
@@ -821,21 +1298,24 @@ class VirtualFileSystem:
         if self._dir_tree_handler.is_path_exists(dst_path_list):  # 如果目标路径存在;
             raise PathExists(f"目标路径'{dst_path}'已经存在, 不能覆盖它")
 
-        # 复制结点 (必须放在处理引用计数前面, 因为要使用其中的异常处理) .
-        self._dir_tree_handler.copy(src_path_list, dst_path_list)
+        # 复制结点, 同时收集副本中所有文件的file_id (必须放在处理引用计数前面, 因为要使用其中的异常处理) .
+        file_ids = []
+        self._dir_tree_handler.copy(src_path_list, dst_path_list, file_ids)
         # 处理引用计数.
         if not self._dir_tree_handler.is_dir(src_path_list):  # 如果是一个文件, 增加其引用计数.
             file_id = self._dir_tree_handler.get_file_hash(src_path_list)
             self._file_quote_count_manager.add_quote_count_for_id(file_id)
-        else:  # 如果是一个目录, 递归的增加其中文件的引用计数.
-            self.__add_quote_count_for_files_in_dir(src_path_list)
+        else:  # 如果是一个目录, 一次性增加其中文件的引用计数.
+            if '' in file_ids:  # 有文件没有file_id时, 重新遍历一次以得到它的路径 (抛出异常) .
+                list(self.__iter_file_ids_in_dir(src_path_list))
+            self._file_quote_count_manager.add_quote_count_for_ids(file_ids)
 
     def delete(self, path: str) -> None:
         """在内部删除一个文件或目录.
 
         Raises:
             InvalidPath: 如果该路径是非法的.
-            InvalidCurrentDirOperation: 如果该路径是当前路径.
+            InvalidCurrentDirOperation: 如果该路径是当前路径, 或当前路径包含该路径.
             PathNotExists: 如果该路径不存在.
         """
         # 条件检查
@@ -843,11 +1323,16 @@ class VirtualFileSystem:
             raise InvalidCurrentDirOperation("在删除操作中, 待删除路径是当前路径, 这是不允许的")
 
         path_list = self.__convert_inner_path_to_list_path(path)
+        # 如果当前路径包含该路径 (必须在处理引用计数前检查) .
+        current_dir_path = self._dir_tree_handler.get_current_dir_path()
+        path_absolute = path_list if path_list[0] == '/' else current_dir_path + path_list
+        if current_dir_path[:len(path_absolute)] == path_absolute:
+            raise InvalidCurrentDirOperation(f"在删除操作中, 当前路径包含待删除路径'{path}', 这是不允许的")
         # 处理文件引用计数.
-        if not self._dir_tree_handler.is_dir(path_list):  # 如果是一个文件, 减少其引用计数 (当减为 0 时, 将这个实体文件删除) .
+        if not self._dir_tree_handler.is_dir(path_list):  # 如果是一个文件, 减少其引用计数 (当减为 0 时, 在保存时删除这个实体文件) .
             file_id = self._dir_tree_handler.get_file_hash(path_list)
             if self._file_quote_count_manager.sub_quote_count_for_id(file_id):
-                os.remove(os.path.join(self._entity_files_dir, file_id))
+                self._entity_files_to_remove.add(file_id)
         else:  # 如果是一个目录, 递归减少引用计数.
             self.__sub_quote_count_for_files_in_dir(path_list)
         # 删除结点
@@ -878,9 +1363,11 @@ class VirtualFileSystem:
         """查询指定散列值的文件是否存在.
 
         Notes:
-            * 可以考虑一下, 要不要做成和引用计数管理器相关的, 而不是和实体文件集目录相关的 (这是值得考虑的) .
+            * 以引用计数为准 (一个实体文件存在, 当且仅当它的引用计数存在) , 只需查询引用计数管理器 (通常命中它的缓存) ,
+              而不用查询实体文件集目录.
+            * 一次导入的过程中, 实体文件可能先于它的引用计数被写入, 这时它仍被视为不存在 (于是可能被再写入一次, 内容是相同的) .
         """
-        return os.path.exists(os.path.join(self._entity_files_dir, file_id))
+        return self._file_quote_count_manager.is_id_exists(file_id)
 
     def add_file_via_hash_value(self, path: str, file_id: str) -> None:
         """向指定路径添加指定散列值的文件 (非覆盖式) .
@@ -904,8 +1391,7 @@ class VirtualFileSystem:
             raise InvalidOperation(f"该散列值'{file_id}'的文件不存在")
 
         # 增加该文件 (必须放在处理引用计数前面, 因为要使用其中的异常处理) .
-        self._dir_tree_handler.create_file(path_list)
-        self._dir_tree_handler.set_file_hash(path_list, file_id)
+        self._dir_tree_handler.create_file(path_list, file_id)
         # 增加文件的引用.
         self._file_quote_count_manager.add_quote_count_for_id(file_id)
 
@@ -981,9 +1467,9 @@ class VirtualFileSystem:
             其他由外部文件操作引发的异常也可能发生.
         """
         if not outer_dst_name:
-            self.copy_from_outside(inner_path, os.path.join(outer_dir, os.path.basename(inner_path)))
+            self.copy_to_outside(inner_path, os.path.join(outer_dir, os.path.basename(inner_path)))
         else:
-            self.copy_from_outside(inner_path, os.path.join(outer_dir, outer_dst_name))
+            self.copy_to_outside(inner_path, os.path.join(outer_dir, outer_dst_name))
 
     def simple_move(self, src_path: str, dst_dir: str, dst_name: str = None) -> None:
         """在内部 (即在该虚拟文件系统中的) 移动一个文件或目录 (这就包括了重命名)  (非覆盖式) .
@@ -1026,12 +1512,14 @@ class VirtualFileSystem:
             self.copy(src_path, self.__join_two_inner_paths(dst_dir, dst_name))
 
     # 添加功能
-    def copy_dir_from_outside_ex(self, outer_path: str, inner_path: str, type_filter: list) -> None:
+    def copy_dir_from_outside_ex(self, outer_path: str, inner_path: str, type_filter: Union[list, set]) -> None:
         """向指定路径以复制的方式添加一个外部目录, 只添加指定后缀的文件 (非覆盖式) .
 
         Notes:
             * 在使用前应检查内部路径是否存在.
             * 如果内部路径存在, 则抛出异常.
+            * type_filter 是扩展名的列表或集合 (不区分大小写, 可以带 '.') , 其中的空字符串表示没有扩展名的文件
+              (文件名中没有 '.', 或者只在开头有 '.') .
 
         Raises:
             InvalidPath: 如果内部路径是非法的.
@@ -1045,18 +1533,20 @@ class VirtualFileSystem:
             其他由外部文件操作引发的异常也可能发生.
         """
         # 条件检查.
-        if self.__is_outer_path_contained(outer_path, self._root_dir):  # 检查外部路径中是否包含根目录.
+        if self.__is_root_dir_contained(outer_path):  # 检查外部路径中是否包含根目录.
             raise InvalidOperation("外部路径不能和根目录相关")
 
         inner_path_list = self.__convert_inner_path_to_list_path(inner_path)
-        self.__copy_dir_from_outside_ex(outer_path, inner_path_list, type_filter)
+        self.__copy_dir_from_outside_ex(outer_path, inner_path_list, self.__normalize_type_filter(type_filter))
 
-    def copy_dir_to_outside_ex(self, inner_path: str, outer_path: str, type_filter: list) -> None:
+    def copy_dir_to_outside_ex(self, inner_path: str, outer_path: str, type_filter: Union[list, set]) -> None:
         """将指定路径的文件或目录复制到外部的指定路径 (非覆盖式) .
 
         Notes:
             * 在使用前应当检查外部路径是否存在.
             * 如果外部路径存在, 则抛出异常.
+            * type_filter 是扩展名的列表或集合 (不区分大小写, 可以带 '.') , 其中的空字符串表示没有扩展名的文件
+              (文件名中没有 '.', 或者只在开头有 '.') .
 
         Raises:
             InvalidPath: 如果内部路径是非法的.
@@ -1069,7 +1559,7 @@ class VirtualFileSystem:
             其他由外部文件操作引发的异常也可能发生.
         """
         inner_path_list = self.__convert_inner_path_to_list_path(inner_path)
-        self.__copy_dir_to_outside_ex(inner_path_list, outer_path, type_filter)
+        self.__copy_dir_to_outside_ex(inner_path_list, outer_path, self.__normalize_type_filter(type_filter))
 
     def compare_two_dir(self, base_dir_path: str, patch_dir_path: str) -> str:
         """比较两个目录的内容.
@@ -1089,67 +1579,52 @@ class VirtualFileSystem:
         Raises:
             PathNotExists: 如果其中有一个路径不存在.
             PathIsNotDir: 如果其中有一个路径存在但不对应一个目录.
+            FileIDNotFound: 如果其中有一个目录中有文件没有file_id.
         """
-        def get_files_in_dir(dir_path: str) -> dict:
-            """获得指定目录中的所有文件信息
+        def iter_files_in_dir(dir_path: str):
+            """依次获得指定目录中的所有文件信息
 
-            Warnings:
-                -这里暂且没去管这种情况: 如果这个目录中有文件是没有 file_id 对应的.
+            Notes:
+                -直接遍历目录树中的结点 (见 `DirTreeHandler.iter_files`) , 不切换当前目录.
+                -相对路径是名称的元组, 只有要输出的才连接成字符串.
 
-            Returns:
-                返回的是一个字典, 字典中的元素的 key 是相对与这个 dir_path 的相对路径, value 是这个文件的 file_id (也就是 hash 值).
+            Yields:
+                (相对与这个 dir_path 的相对路径的元组, 这个文件的 file_id (也就是 hash 值)) .
 
             Raises:
                 PathNotExists: 如果路径不存在.
                 PathIsNotDir: 如果路径存在但不对应一个目录.
+                FileIDNotFound: 如果目录中有文件没有file_id.
             """
-            def add_file_info_in_dir(dir_path: str, current_relative_path: str) -> None:
-                """将该目录中的文件信息添加到 files_dict 中
-
-                Notes:
-                    -这里的 current_relative_path 是指想要加上的相对路径前缀名, 然后这个目录中的文件的文件路径就是 这个前缀名 + 文件名.
-                """
-                # 保存一下当前的路径
-                current_dir_path = self.get_current_dir_path()
-
-                try:
-                    self.chdir(dir_path)
-                    # 遍历
-                    for item in self.get_dir_content(self.get_current_dir_path()):
-                        if self._dir_tree_handler.is_dir([item]):  # 如果是目录, 递归调用自己
-                            add_file_info_in_dir(item, self.__join_two_inner_paths(current_relative_path, item))
-                        else:  # 如果是文件, 将相应的文件信息填入到文件信息字典中
-                            files_dict[self.__join_two_inner_paths(current_relative_path, item)] = self._dir_tree_handler.get_file_hash([item])
-                finally:
-                    # 恢复调用前的当前目录
-                    self.chdir(current_dir_path)
-
-            files_dict = {}  # 待返回的文件信息字典
-            add_file_info_in_dir(dir_path, "")  # 将该目录的文件信息加入到 files_dict 中
-            return files_dict
+            dir_path_list = self.__convert_inner_path_to_tuple_path(dir_path)
+            for relative_path, file_id in self._dir_tree_handler.iter_files(dir_path_list):
+                if file_id is None:
+                    raise FileIDNotFound(
+                        f"路径'{self.__join_two_inner_paths(dir_path, '/'.join(relative_path))}'存在且是一个文件但没有file_id")
+                yield relative_path, file_id
 
         # 思路是这样的:
         # 要不我们粗暴一点?
-        # 我们将分别遍历这两个目录, 然后输出相对于这个目录的所有文件路径和相应的 hash 值, 即 { relative_file_path : hash, ... },
-        # 然后以补丁形式输出差别就行啦!
-
-        # 获得文件信息字典
-        base_dict = get_files_in_dir(base_dir_path)
-        patch_dict = get_files_in_dir(patch_dir_path)
-
-        diff_str = ""
-        # 找出在 base_dict 中存在但在 patch_dict 中不存在的键值对
-        for item in base_dict.items():
-            if item[0] not in patch_dict:
-                diff_str += '-' + item[0] + '\n'
-            elif item[1] != patch_dict[item[0]]:
-                diff_str += '-' + item[0] + '\n'
-
-        # 找出在 patch_dict 中存在但在 base_dict 中不存在的键值对
-        for item in patch_dict.items():
-            if item[0] not in base_dict:
-                diff_str += '+' + item[0] + '\n'
-            elif item[1] != base_dict[item[0]]:
-                diff_str += '+' + item[0] + '\n'
-
-        return diff_str
+        # 我们将遍历基准目录, 得到相对于这个目录的所有文件路径和相应的 hash 值, 即 { relative_file_path : hash, ... },
+        # 然后一边遍历另一个目录一边和它比较, 以补丁形式输出差别就行啦!
+
+        # 获得基准目录的文件信息字典
+        base_dict = dict(iter_files_in_dir(base_dir_path))
+
+        # 找出在 patch_dir_path 中存在但在 base_dict 中不存在 (或者 hash 值不同) 的文件, 同时记下两边相同的文件
+        # (不再为 patch_dir_path 生成一个字典) .
+        base_get = base_dict.get
+        unchanged_paths = set()
+        plus_lines = []
+        for relative_path, file_id in iter_files_in_dir(patch_dir_path):
+            if base_get(relative_path) == file_id:
+                unchanged_paths.add(relative_path)
+            else:
+                plus_lines.append(f"+{'/'.join(relative_path)}\n")
+
+        # 找出在 base_dict 中存在但在 patch_dir_path 中不存在 (或者 hash 值不同) 的文件, 它们在前面.
+        # 差异的各行先放在列表中, 最后一次连接 (而不是反复地连接字符串) .
+        diff_lines = [f"-{'/'.join(relative_path)}\n" for relative_path in base_dict
+                      if relative_path not in unchanged_paths]
+        diff_lines += plus_lines
+        return ''.join(diff_lines)
@@ -1,6 +1,76 @@
-from file_system._utils.count_manager import CountManager
+import tempfile
+
+from file_system._utils.count_manager import CountManager, SELECT_BATCH_SIZE
+from file_system.errors import CounterNotExists
+
+
+def check_add_quote_count_for_ids():
+    """批量增加计数: 同一个标识出现几次就增加几次, 不存在的标识会被创建."""
+    with CountManager(tempfile.mkdtemp()) as ct:
+        ct.add_quote_count_for_id("a")
+        assert ct.get_quote_count_for_id("a") == 1  # 让 "a" 的计数进入缓存.
+        ct.add_quote_count_for_ids(["a", "b", "a", "c", "a"])
+        assert ct.get_quote_count_for_id("a") == 4  # 缓存也随之更新.
+        assert ct.get_quote_count_for_id("b") == 1
+        assert ct.get_quote_count_for_id("c") == 1
+        ct.add_quote_count_for_ids([])  # 空的批量操作什么都不做.
+        assert ct.get_quote_count_for_id("a") == 4
+    print("check_add_quote_count_for_ids: OK")
+
+
+def check_sub_quote_count_for_ids():
+    """批量减少计数: 同一个标识出现几次就减少几次, 返回计数因此减为0 (被删除) 的标识."""
+    with CountManager(tempfile.mkdtemp()) as ct:
+        ct.add_quote_count_for_ids(["x", "x", "y", "y", "y", "z"])
+        assert ct.get_quote_count_for_id("y") == 3
+        deleted_ids = ct.sub_quote_count_for_ids(["x", "y", "x", "z"])
+        assert deleted_ids == ["x", "z"]
+        assert not ct.is_id_exists("x") and not ct.is_id_exists("z")
+        assert ct.get_quote_count_for_id("y") == 2
+    print("check_sub_quote_count_for_ids: OK")
+
+
+def check_large_batches():
+    """超过 `SELECT_BATCH_SIZE` 个标识时分批查询 (最后一批不满, 用 None 补齐) ."""
+    ids = [f"id{i}" for i in range(SELECT_BATCH_SIZE * 2 + 37)]
+    with CountManager(tempfile.mkdtemp()) as ct:
+        ct.add_quote_count_for_ids(ids + ids[::2])  # 偶数位置的标识的计数为2, 其余的为1.
+        deleted_ids = ct.sub_quote_count_for_ids(ids)
+        assert deleted_ids == ids[1::2]
+        for i, counter_id in enumerate(ids):
+            if i % 2:
+                assert not ct.is_id_exists(counter_id)
+            else:
+                assert ct.get_quote_count_for_id(counter_id) == 1
+        assert ct.sub_quote_count_for_ids(ids[::2]) == ids[::2]
+        assert not any(ct.is_id_exists(counter_id) for counter_id in ids)
+    print("check_large_batches: OK")
+
+
+def check_sub_quote_count_for_ids_is_all_or_nothing():
+    """批量减少计数时, 只要有一个标识不能减少 (不存在, 或者减少的次数超过了它的计数) , 就什么都不修改."""
+    ids = [f"id{i}" for i in range(SELECT_BATCH_SIZE + 1)]
+    with CountManager(tempfile.mkdtemp()) as ct:
+        ct.add_quote_count_for_ids(ids + ["twice", "twice"])
+        for bad_ids in (ids + ["missing"], ["twice"] + ids + ["twice", "twice"]):
+            try:
+                ct.sub_quote_count_for_ids(bad_ids)
+            except CounterNotExists:
+                pass
+            else:
+                raise AssertionError("应当引发 CounterNotExists")
+            assert all(ct.get_quote_count_for_id(counter_id) == 1 for counter_id in ids)
+            assert ct.get_quote_count_for_id("twice") == 2
+    print("check_sub_quote_count_for_ids_is_all_or_nothing: OK")
+
 
 if __name__ == "__main__":
+    # 先检查批量的增减 (使用临时目录) , 下面的示例最后会引发异常.
+    check_add_quote_count_for_ids()
+    check_sub_quote_count_for_ids()
+    check_large_batches()
+    check_sub_quote_count_for_ids_is_all_or_nothing()
+
     ID_TMP = "test"
     with CountManager('.') as ct:  # 指定SQLite文件的存放位置为当前目录.
         ct.create_quote_count_for_id(ID_TMP)
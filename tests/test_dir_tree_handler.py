@@ -1,5 +1,220 @@
+import os
+import json
+import shutil
+import tempfile
+
+from file_system import _dir_tree_handler
 from file_system._dir_tree_handler import DirTreeHandler
 
+OLD_TIME = "2000-01-01 00:00"  # 一个一定比现在早的 (格式化的) 时间.
+
+
+def check_parent_last_modify_time():
+    """在一个目录中创建结点之后, 它所在的目录和所有上层目录的最后修改时间都会被更新."""
+    json_path = os.path.join(tempfile.mkdtemp(), 'test.json')
+    with DirTreeHandler(json_path) as d:
+        d.mkdir(['/', 'a'])
+        d.mkdir(['/', 'a', 'b'])
+    # 把已保存的目录树中两个目录的最后修改时间改成很早以前.
+    with open(json_path, encoding='utf-8') as f:
+        tree = json.load(f)
+    dir_a = tree[2]['a']
+    dir_b = dir_a[2]['b']
+    dir_a[1]['1'] = dir_b[1]['1'] = OLD_TIME
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(tree, f)
+    with DirTreeHandler(json_path) as d:
+        d.create_file(['/', 'a', 'b', 'new_file'])
+        file_time = d.get_metadata_of_path(['/', 'a', 'b', 'new_file'])['1']
+        assert d.get_metadata_of_path(['/', 'a', 'b'])['1'] == file_time  # 所在的目录.
+        assert d.get_metadata_of_path(['/', 'a'])['1'] == file_time  # 上层目录.
+        assert file_time != OLD_TIME
+    print("check_parent_last_modify_time: OK")
+
+
+def snapshot(d: DirTreeHandler, with_time: bool = True) -> list:
+    """按遍历的顺序列出目录树中的每个结点的 (路径, 是否是目录, 元数据, 散列值) , 用于比较两棵目录树."""
+    entries = []
+    for relative_path, dir_names, files in d.walk(['/']):
+        children = [(name, True, None) for name in dir_names]
+        children += [(name, False, hash_value) for name, hash_value in files]
+        for name, is_dir, hash_value in children:
+            path = ['/'] + relative_path + [name]
+            metadata = d.get_metadata_of_path(path)
+            if not with_time:  # 不同的目录树是在不同的时间修改的, 这时不比较时间.
+                metadata = {key: value for key, value in metadata.items() if key not in ('0', '1')}
+            entries.append((path, is_dir, metadata, hash_value))
+    return entries
+
+
+def build_sample(d: DirTreeHandler) -> None:
+    """创建一棵用于检查的目录树."""
+    d.mkdir(['/', 'docs'])
+    d.create_file(['/', 'docs', 'readme.txt'], 'h1')
+    d.create_file(['/', 'docs', '说明.txt'], 'h2')
+    d.mkdir(['/', 'src'])
+    d.create_file(['/', 'src', 'main.py'], 'h3')
+    d.mkdir(['/', 'src', 'lib'])
+    d.create_file(['/', 'src', 'lib', 'util.py'], 'h4')
+    d.mkdir(['/', 'src', 'lib', 'deep'])
+    d.create_file(['/', 'src', 'lib', 'deep', 'leaf.py'])
+    d.mkdir(['/', 'empty'])
+    d.mkdir(['/', 'assets'])  # 让 `json` 文件大一些, 这样少量的修改只会追加到修改日志中.
+    for i in range(100):
+        d.create_file(['/', 'assets', f'image{i}.png'], f'hash{i}')
+
+
+def mutate(d: DirTreeHandler) -> None:
+    """对 `build_sample` 创建的目录树做各种修改 (每种会记入修改日志的操作都有) ."""
+    d.mkdir(['/', 'build'])
+    d.create_file(['/', 'build', 'out.bin'], 'h5')
+    d.set_file_hash(['/', 'docs', 'readme.txt'], 'h6')
+    d.modify_metadata_of_path(['/', 'src', 'main.py'], {'作者': '张三'})
+    d.move(['/', 'src', 'lib'], ['/', 'build', 'lib'])
+    d.copy(['/', 'docs'], ['/', 'docs_copy'])
+    d.delete(['/', 'empty'])
+
+
+def store_with_full_rewrite(d: DirTreeHandler) -> None:
+    """保存, 并且重写整个 `json` 文件 (不追加修改日志) ."""
+    compact_ratio = _dir_tree_handler.LOG_COMPACT_RATIO
+    _dir_tree_handler.LOG_COMPACT_RATIO = 0
+    try:
+        d.store_change()
+    finally:
+        _dir_tree_handler.LOG_COMPACT_RATIO = compact_ratio
+
+
+def read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def check_log_replay():
+    """修改之后只追加修改日志, 重新加载 (重放日志) 的结果和重写整个 `json` 文件的一样."""
+    tmp_dir = tempfile.mkdtemp()
+    json_path = os.path.join(tmp_dir, 'log.json')
+    full_json_path = os.path.join(tmp_dir, 'full.json')
+    for path in (json_path, full_json_path):
+        with DirTreeHandler(path) as d:
+            build_sample(d)
+    json_bytes = read_bytes(json_path)
+    with DirTreeHandler(json_path) as d:
+        mutate(d)
+        expected = snapshot(d)
+    assert os.path.exists(json_path + '.log')  # 修改写入了日志,
+    assert read_bytes(json_path) == json_bytes  # 而没有重写 `json` 文件.
+    with DirTreeHandler(json_path) as d:
+        assert snapshot(d) == expected
+    d = DirTreeHandler(full_json_path)
+    mutate(d)
+    store_with_full_rewrite(d)
+    assert not os.path.exists(full_json_path + '.log')
+    assert snapshot(DirTreeHandler(json_path), False) == snapshot(DirTreeHandler(full_json_path), False)
+    print("check_log_replay: OK")
+
+
+def check_stale_log():
+    """重写 `json` 文件之后留下的 (旧的) 修改日志会被忽略 (并删除) ."""
+    json_path = os.path.join(tempfile.mkdtemp(), 'test.json')
+    log_path = json_path + '.log'
+    with DirTreeHandler(json_path) as d:
+        build_sample(d)
+    with DirTreeHandler(json_path) as d:
+        mutate(d)
+    stale_log = read_bytes(log_path)
+    d = DirTreeHandler(json_path)
+    d.mkdir(['/', 'after_rewrite'])
+    store_with_full_rewrite(d)
+    expected = snapshot(d)
+    assert not os.path.exists(log_path)
+    with open(log_path, 'wb') as f:  # 模拟重写 `json` 文件之后还没来得及删除日志.
+        f.write(stale_log)
+    with DirTreeHandler(json_path) as d:
+        assert snapshot(d) == expected
+    assert not os.path.exists(log_path)
+    print("check_stale_log: OK")
+
+
+def check_log_compaction():
+    """修改日志的大小超过 `json` 文件的大小的 `LOG_COMPACT_RATIO` 倍时, 改为重写整个 `json` 文件并删除日志."""
+    json_path = os.path.join(tempfile.mkdtemp(), 'test.json')
+    log_path = json_path + '.log'
+    with DirTreeHandler(json_path) as d:
+        build_sample(d)
+    json_size = os.path.getsize(json_path)
+    has_log = is_compacted = False
+    for i in range(1000):
+        with DirTreeHandler(json_path) as d:
+            d.mkdir(['/', f'dir{i}'])
+            expected = snapshot(d)
+        if os.path.exists(log_path):
+            assert os.path.getsize(log_path) <= json_size * _dir_tree_handler.LOG_COMPACT_RATIO
+            has_log = True
+        elif has_log:
+            is_compacted = True
+            break
+    assert is_compacted
+    assert os.path.getsize(json_path) > json_size
+    with DirTreeHandler(json_path) as d:
+        assert snapshot(d) == expected
+    print("check_log_compaction: OK")
+
+
+def open_eagerly(json_path: str) -> DirTreeHandler:
+    """加载目录树, 并立即生成所有的结点 (遍历一次) ."""
+    d = DirTreeHandler(json_path)
+    for _ in d.walk(['/']):
+        pass
+    return d
+
+
+def is_unloaded(d: DirTreeHandler, name: str) -> bool:
+    """根目录中的指定目录是否还没有生成子结点 (延迟加载) ."""
+    return d._dir_tree.content[name]._raw is not None
+
+
+def check_lazy_loading():
+    """对没有加载过的目录的操作, 结果和把目录树全部加载之后再操作的一样."""
+    json_path = os.path.join(tempfile.mkdtemp(), 'test.json')
+    with DirTreeHandler(json_path) as d:
+        build_sample(d)
+    # 遍历.
+    lazy, eager = DirTreeHandler(json_path), open_eagerly(json_path)
+    assert list(lazy.iter_files(['/', 'src'])) == list(eager.iter_files(['/', 'src']))
+    lazy = DirTreeHandler(json_path)
+    assert list(lazy.walk(['/', 'src'])) == list(eager.walk(['/', 'src']))
+    # 复制, 移动, 删除 (操作前 'src' 都还没有加载) .
+    operations = [
+        lambda d: d.copy(['/', 'src'], ['/', 'src_copy']),
+        lambda d: d.copy(['/', 'src', 'lib'], ['/', 'docs', 'lib']),
+        lambda d: d.move(['/', 'src'], ['/', 'docs', 'src']),
+        lambda d: d.move(['/', 'src', 'lib', 'deep'], ['/', 'deep']),
+        lambda d: d.delete(['/', 'src']),
+        lambda d: d.delete(['/', 'src', 'lib']),
+    ]
+    for operation in operations:
+        lazy, eager = DirTreeHandler(json_path), open_eagerly(json_path)
+        assert is_unloaded(lazy, 'src')
+        operation(lazy)
+        operation(eager)
+        assert snapshot(lazy, False) == snapshot(eager, False)
+    # 保存时没有访问过的子树原样输出, 访问过的 (包括移动之后有挂起的修改时间的) 正常输出.
+    for i, operation in enumerate((lambda d: d.mkdir(['/', 'new_dir']), lambda d: d.move(['/', 'src'], ['/', 'moved']))):
+        copy_path = os.path.join(os.path.dirname(json_path), f'copy{i}.json')  # 不修改原来的目录树.
+        shutil.copyfile(json_path, copy_path)
+        lazy = DirTreeHandler(copy_path)
+        operation(lazy)
+        assert is_unloaded(lazy, 'docs') and is_unloaded(lazy, 'assets')
+        store_with_full_rewrite(lazy)
+        expected = snapshot(lazy)
+        assert snapshot(DirTreeHandler(copy_path)) == expected
+        eager = open_eagerly(json_path)
+        operation(eager)
+        assert snapshot(eager, False) == snapshot(lazy, False)
+    print("check_lazy_loading: OK")
+
+
 if __name__ == "__main__":
     # 以从无到有创建一个目录结构如下的目录树为例.
     # /
@@ -71,3 +286,10 @@ if __name__ == "__main__":
         d.mkdir(['test'])
         d.chdir(['/', 'SoftwareDevelopmentExperiment'])
         d.create_file(['一些说明.txt'])
+
+    # 下面的检查使用临时目录, 不依赖上面的示例.
+    check_parent_last_modify_time()
+    check_log_replay()
+    check_stale_log()
+    check_log_compaction()
+    check_lazy_loading()
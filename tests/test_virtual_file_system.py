@@ -1,4 +1,52 @@
+import os
+import tempfile
+
 from file_system.tools import simple_ui
+from file_system.virtual_file_system import VirtualFileSystem
+
+
+def write_file(path: str, content: bytes) -> None:
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def check_move_from_outside_keeps_link_targets():
+    """以移动的方式导入时, 链接指向的 (外部目录之外的) 文件和目录不变, 只删除链接本身."""
+    tmp_dir = tempfile.mkdtemp()
+    src = os.path.join(tmp_dir, 'src')
+    elsewhere = os.path.join(tmp_dir, 'elsewhere')
+    other = os.path.join(tmp_dir, 'other')
+    os.makedirs(os.path.join(src, 'real'))
+    os.makedirs(os.path.join(elsewhere, 'sub'))
+    os.makedirs(other)
+    write_file(os.path.join(src, 'real', 'moved.txt'), b'moved')
+    write_file(os.path.join(elsewhere, 'keep.txt'), b'keep')
+    write_file(os.path.join(elsewhere, 'sub', 'deep.txt'), b'deep')
+    write_file(os.path.join(other, 'other.txt'), b'other')
+    try:
+        os.symlink(os.path.join('..', 'elsewhere'), os.path.join(src, 'link'), target_is_directory=True)
+        os.symlink(other, os.path.join(tmp_dir, 'dir_link'), target_is_directory=True)
+    except (OSError, NotImplementedError):  # 比如在 Windows 上没有创建链接的权限.
+        print("check_move_from_outside_keeps_link_targets: SKIPPED")
+        return
+    with VirtualFileSystem(tempfile.mkdtemp(), 'user') as vfs:
+        # 外部目录中有指向目录的链接.
+        vfs.move_from_outside(src, '/src')
+        assert not os.path.lexists(src)
+        assert sorted(os.listdir(elsewhere)) == ['keep.txt', 'sub']
+        assert os.listdir(os.path.join(elsewhere, 'sub')) == ['deep.txt']
+        assert vfs.get_file_content('/src/real/moved.txt') == b'moved'
+        assert vfs.get_file_content('/src/link/keep.txt') == b'keep'
+        assert vfs.get_file_content('/src/link/sub/deep.txt') == b'deep'
+        # 外部路径本身是指向目录的链接.
+        vfs.move_from_outside(os.path.join(tmp_dir, 'dir_link'), '/dir_link')
+        assert not os.path.lexists(os.path.join(tmp_dir, 'dir_link'))
+        assert os.listdir(other) == ['other.txt']
+        assert vfs.get_file_content('/dir_link/other.txt') == b'other'
+    print("check_move_from_outside_keeps_link_targets: OK")
+
 
 if __name__ == "__main__":
+    # 先做检查 (使用临时目录) , 再启动交互界面.
+    check_move_from_outside_keeps_link_targets()
     simple_ui.run()